@@ -243,11 +243,19 @@ class HolyCalculatorApp:
                             f"(confidence: {prompt_result['metadata']['confidence']:.2f})"
                         )
 
-                        # Send to LLM for pedagogical response
-                        result = self_inner.engine.solve(
-                            prompt_result['prompt'],
-                            force_layer='llm'
-                        )
+                        # Send to LLM for pedagogical response, unless the
+                        # wrapper already computed plain arithmetic
+                        if prompt_result['direct_answer'] is not None:
+                            result = {
+                                'success': True,
+                                'result': prompt_result['direct_answer'],
+                                'source': 'arithmetic'
+                            }
+                        else:
+                            result = self_inner.engine.solve(
+                                prompt_result['prompt'],
+                                force_layer='llm'
+                            )
 
                         elapsed = time.time() - start_time
 
@@ -4,18 +4,11 @@ import psutil
 import platform
 from datetime import datetime
 
+from sysstats import gb, get_cpu_temperature, mb
+
 app = Flask(__name__)
 CORS(app)  # Enable CORS for React frontend
 
-def get_cpu_temperature():
-    """Get CPU temperature - works on Raspberry Pi"""
-    try:
-        with open('/sys/class/thermal/thermal_zone0/temp', 'r') as f:
-            temp = float(f.read()) / 1000.0
-            return round(temp, 1)
-    except:
-        return None
-
 def get_system_stats():
     """Gather system statistics"""
     # CPU usage
@@ -45,20 +38,20 @@ def get_system_stats():
             'temperature': get_cpu_temperature()
         },
         'memory': {
-            'total': round(memory.total / (1024**3), 2),
-            'used': round(memory.used / (1024**3), 2),
+            'total': gb(memory.total),
+            'used': gb(memory.used),
             'percent': memory.percent,
-            'available': round(memory.available / (1024**3), 2)
+            'available': gb(memory.available)
         },
         'disk': {
-            'total': round(disk.total / (1024**3), 2),
-            'used': round(disk.used / (1024**3), 2),
-            'free': round(disk.free / (1024**3), 2),
+            'total': gb(disk.total),
+            'used': gb(disk.used),
+            'free': gb(disk.free),
             'percent': disk.percent
         },
         'network': {
-            'bytes_sent': round(net_io.bytes_sent / (1024**2), 2),
-            'bytes_recv': round(net_io.bytes_recv / (1024**2), 2)
+            'bytes_sent': mb(net_io.bytes_sent),
+            'bytes_recv': mb(net_io.bytes_recv)
         },
         'system': {
             'platform': platform.system(),
@@ -84,4 +77,4 @@ def health():
 
 if __name__ == '__main__':
     # Run on all interfaces so you can access from other devices
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    app.run(host='0.0.0.0', port=5000, debug=False)
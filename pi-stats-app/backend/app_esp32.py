@@ -16,10 +16,24 @@ from flask import Flask, jsonify, request
 from flask_cors import CORS
 import psutil
 import platform
+import os
+import importlib.util
 from datetime import datetime, timedelta
 from collections import deque
 import json
 import logging
+import sys
+from pathlib import Path
+
+from sysstats import gb, get_cpu_temperature, mb
+
+# Optional calculator integration, resolved once at import instead of per request
+# (only located, not imported: the endpoint just reports whether it is installed)
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / 'scripts'))
+try:
+    CALCULATOR_AVAILABLE = importlib.util.find_spec('cascade.calculator_engine') is not None
+except ImportError:  # no cascade package on the path
+    CALCULATOR_AVAILABLE = False
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for React frontend
@@ -86,15 +100,6 @@ ESP32_TIMEOUT_SECONDS = 10
 # RASPBERRY PI STATS (Original Functionality)
 # ============================================================================
 
-def get_cpu_temperature():
-    """Get CPU temperature - works on Raspberry Pi"""
-    try:
-        with open('/sys/class/thermal/thermal_zone0/temp', 'r') as f:
-            temp = float(f.read()) / 1000.0
-            return round(temp, 1)
-    except:
-        return None
-
 def get_system_stats():
     """Gather system statistics"""
     # CPU usage
@@ -124,20 +129,20 @@ def get_system_stats():
             'temperature': get_cpu_temperature()
         },
         'memory': {
-            'total': round(memory.total / (1024**3), 2),
-            'used': round(memory.used / (1024**3), 2),
+            'total': gb(memory.total),
+            'used': gb(memory.used),
             'percent': memory.percent,
-            'available': round(memory.available / (1024**3), 2)
+            'available': gb(memory.available)
         },
         'disk': {
-            'total': round(disk.total / (1024**3), 2),
-            'used': round(disk.used / (1024**3), 2),
-            'free': round(disk.free / (1024**3), 2),
+            'total': gb(disk.total),
+            'used': gb(disk.used),
+            'free': gb(disk.free),
             'percent': disk.percent
         },
         'network': {
-            'bytes_sent': round(net_io.bytes_sent / (1024**2), 2),
-            'bytes_recv': round(net_io.bytes_recv / (1024**2), 2)
+            'bytes_sent': mb(net_io.bytes_sent),
+            'bytes_recv': mb(net_io.bytes_recv)
         },
         'system': {
             'platform': platform.system(),
@@ -369,29 +374,20 @@ def calculator_stats():
     Get Holy Calculator performance statistics.
     This requires the calculator engine to be accessible.
     """
-    try:
-        import sys
-        from pathlib import Path
-
-        # Add scripts to path
-        sys.path.insert(0, str(Path(__file__).parent.parent.parent / 'scripts'))
-
-        from cascade.calculator_engine import CalculatorEngine
-
-        # This assumes you have a running instance somewhere
-        # In production, you'd want to maintain a singleton
-        # For now, we'll return a placeholder
-        return jsonify({
-            'status': 'available',
-            'message': 'Calculator stats integration available'
-        })
-
-    except ImportError:
+    if not CALCULATOR_AVAILABLE:
         return jsonify({
             'status': 'unavailable',
             'message': 'Calculator engine not found'
         }), 404
 
+    # This assumes you have a running instance somewhere
+    # In production, you'd want to maintain a singleton
+    # For now, we'll return a placeholder
+    return jsonify({
+        'status': 'available',
+        'message': 'Calculator stats integration available'
+    })
+
 # ============================================================================
 # MAIN
 # ============================================================================
@@ -411,4 +407,9 @@ if __name__ == '__main__':
     logger.info("="*70)
 
     # Run on all interfaces so you can access from ESP32 and other devices
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    if os.environ.get('DEV'):
+        app.run(host='0.0.0.0', port=5000)
+    else:
+        # Production WSGI server: a thread pool absorbs bursts of ESP32 POSTs
+        from waitress import serve
+        serve(app, host='0.0.0.0', port=5000, threads=32, connection_limit=1000)
@@ -4,40 +4,55 @@ Flask Backend with MQTT Integration
 Serves web dashboard with real-time ESP32 data via MQTT.
 
 Architecture:
-- MQTT subscriber runs in background thread
+- MQTT subscriber runs on paho's network thread (loop_start)
 - Flask serves HTTP API and dashboard
 - Data flows: ESP32 → MQTT → Python → Flask → Browser
 
 Advantages:
-- Real-time updates via MQTT (low latency)
+- Real-time updates via MQTT, pushed to the browser with Server-Sent Events
 - HTTP API for dashboard access
 - Decoupled ESP32 and web frontend
 - Multiple ESP32 devices supported
 """
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
 import psutil
 import platform
+import os
+import importlib.util
 from datetime import datetime
+import json
 import logging
+import hashlib
 import sys
 from pathlib import Path
 
+from sysstats import gb, get_cpu_temperature, mb
+
 # Add monitoring module to path
 sys.path.insert(0, str(Path(__file__).parent.parent.parent / 'scripts'))
 
 # Import MQTT monitor
 from monitoring.mqtt_monitor import (
     create_mqtt_client,
+    create_publish_client,
     get_current_data,
-    get_history_data,
+    get_history_columns,
     get_statistics,
     is_esp32_connected,
-    history_snapshot_task
+    wait_for_update
 )
 
+# Optional calculator integration, resolved once at import instead of per request
+# (only located, not imported: the endpoint just reports whether it is installed)
+try:
+    CALCULATOR_AVAILABLE = importlib.util.find_spec('cascade.calculator_engine') is not None
+except ImportError:  # no cascade package on the path
+    CALCULATOR_AVAILABLE = False
+
 import threading
+import time
 import paho.mqtt.client as mqtt
 
 app = Flask(__name__)
@@ -50,42 +65,49 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Max seconds between Server-Sent Event pushes when no MQTT data arrives
+STREAM_REFRESH_SECONDS = 5
+
+# Each open stream holds a server thread, so at most half of gunicorn's threads
+# (GUNICORN_THREADS, default 8) stream at once and other endpoints stay free.
+# Streams also end after STREAM_MAX_SECONDS; EventSource reconnects by itself.
+STREAM_MAX_CLIENTS = max(1, int(os.environ.get('GUNICORN_THREADS', 8)) // 2)
+STREAM_MAX_SECONDS = 300
+STREAM_BUSY_RETRY_MS = 10000  # Reconnect delay for clients over the cap
+_stream_slots = threading.BoundedSemaphore(STREAM_MAX_CLIENTS)
+
 # ============================================================================
 # MQTT BACKGROUND THREAD
 # ============================================================================
 
-# Global MQTT client
+# Global MQTT clients (subscriber + publish-only)
 mqtt_client = None
-mqtt_thread = None
-history_thread = None
+mqtt_pub_client = None
 
 def start_mqtt_monitor():
-    """Start MQTT monitoring in background thread"""
-    global mqtt_client, mqtt_thread, history_thread
+    """Start MQTT monitoring on paho's network thread"""
+    global mqtt_client, mqtt_pub_client
 
     logger.info("Starting MQTT monitor...")
 
-    # Create MQTT client
+    # Create MQTT clients
     mqtt_client = create_mqtt_client()
+    mqtt_pub_client = create_publish_client()
 
     # Connect to broker
     try:
         mqtt_client.connect("localhost", 1883, 60)
-        logger.info("✓ MQTT client connected")
+        mqtt_pub_client.connect("localhost", 1883, 60)
+        logger.info("✓ MQTT clients connected")
     except Exception as e:
         logger.error(f"✗ Failed to connect to MQTT broker: {e}")
         logger.error("Make sure Mosquitto is running: sudo systemctl start mosquitto")
         return False
 
-    # Start MQTT loop in background thread
-    mqtt_thread = threading.Thread(target=mqtt_client.loop_forever, daemon=True)
-    mqtt_thread.start()
-    logger.info("✓ MQTT thread started")
-
-    # Start history snapshot thread
-    history_thread = threading.Thread(target=history_snapshot_task, daemon=True)
-    history_thread.start()
-    logger.info("✓ History thread started")
+    # Let paho run its own network loop (handles reconnects as well)
+    mqtt_client.loop_start()
+    mqtt_pub_client.loop_start()
+    logger.info("✓ MQTT loops started")
 
     return True
 
@@ -93,15 +115,6 @@ def start_mqtt_monitor():
 # RASPBERRY PI STATS (Original Functionality)
 # ============================================================================
 
-def get_cpu_temperature():
-    """Get CPU temperature - works on Raspberry Pi"""
-    try:
-        with open('/sys/class/thermal/thermal_zone0/temp', 'r') as f:
-            temp = float(f.read()) / 1000.0
-            return round(temp, 1)
-    except:
-        return None
-
 def get_system_stats():
     """Gather system statistics"""
     # CPU usage
@@ -131,20 +144,20 @@ def get_system_stats():
             'temperature': get_cpu_temperature()
         },
         'memory': {
-            'total': round(memory.total / (1024**3), 2),
-            'used': round(memory.used / (1024**3), 2),
+            'total': gb(memory.total),
+            'used': gb(memory.used),
             'percent': memory.percent,
-            'available': round(memory.available / (1024**3), 2)
+            'available': gb(memory.available)
         },
         'disk': {
-            'total': round(disk.total / (1024**3), 2),
-            'used': round(disk.used / (1024**3), 2),
-            'free': round(disk.free / (1024**3), 2),
+            'total': gb(disk.total),
+            'used': gb(disk.used),
+            'free': gb(disk.free),
             'percent': disk.percent
         },
         'network': {
-            'bytes_sent': round(net_io.bytes_sent / (1024**2), 2),
-            'bytes_recv': round(net_io.bytes_recv / (1024**2), 2)
+            'bytes_sent': mb(net_io.bytes_sent),
+            'bytes_recv': mb(net_io.bytes_recv)
         },
         'system': {
             'platform': platform.system(),
@@ -157,6 +170,31 @@ def get_system_stats():
 
     return stats
 
+# ============================================================================
+# CONDITIONAL RESPONSES
+# ============================================================================
+
+def conditional_json(payload, etag=None):
+    """
+    JSON response that polling clients can revalidate with If-None-Match.
+
+    With a cheap etag (e.g. derived from the last MQTT update) the payload is
+    not serialized at all when the client is current; without one the ETag is
+    hashed from the serialized body.
+    """
+    if etag is None:
+        response = jsonify(payload)
+        response.add_etag(weak=True)
+    elif request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag, weak=True)
+    else:
+        response = jsonify(payload)
+        response.set_etag(etag, weak=True)
+
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
 # ============================================================================
 # API ENDPOINTS - COMBINED STATS
 # ============================================================================
@@ -170,12 +208,13 @@ def api_stats():
     # Get Raspberry Pi stats
     stats = get_system_stats()
 
-    # Add ESP32 data from MQTT
+    # Add ESP32 data from MQTT (with monitor stats, so the dashboard needs one request)
     esp32_data = get_current_data()
+    esp32_data['stats'] = get_statistics()
 
     stats['esp32'] = esp32_data
 
-    return jsonify(stats)
+    return conditional_json(stats)
 
 @app.route('/api/health')
 def health():
@@ -183,7 +222,7 @@ def health():
     return jsonify({
         'status': 'ok',
         'esp32_connected': is_esp32_connected(),
-        'mqtt_active': mqtt_thread is not None and mqtt_thread.is_alive(),
+        'mqtt_active': mqtt_client is not None and mqtt_client.is_connected(),
         'timestamp': datetime.now().isoformat()
     })
 
@@ -194,21 +233,52 @@ def health():
 @app.route('/api/esp32/current')
 def esp32_current():
     """Get current ESP32 readings"""
-    return jsonify(get_current_data())
+    data = get_current_data()
+    return conditional_json(data, etag=f"{data['last_update']}-{data['connected']}")
 
 @app.route('/api/esp32/history')
 def esp32_history():
-    """Get historical ESP32 data"""
+    """
+    Get historical ESP32 data, oldest first.
+
+    Columnar: {"count": n, "columns": {"timestamp": [...], "voltage": [...], ...}}
+    so each field name is sent once rather than once per snapshot.
+    """
     count = request.args.get('count', type=int)
+    columns = get_history_columns(count)
     return jsonify({
-        'data': get_history_data(count),
-        'count': len(get_history_data(count))
+        'count': len(columns['timestamp']),
+        'columns': columns
     })
 
+@app.route('/api/esp32/stream')
+def esp32_stream():
+    """Push ESP32 readings to the dashboard as Server-Sent Events"""
+    def events():
+        if not _stream_slots.acquire(blocking=False):
+            # Too many open streams: send one reading and have the browser
+            # reconnect later, so this client polls instead of holding a thread
+            yield f"retry: {STREAM_BUSY_RETRY_MS}\ndata: {json.dumps(get_current_data())}\n\n"
+            return
+
+        try:
+            deadline = time.monotonic() + STREAM_MAX_SECONDS
+            version = None
+            while time.monotonic() < deadline:
+                # Wakes on each MQTT message; the timeout re-sends so the
+                # connected flag still flips to offline when the ESP32 goes quiet
+                version = wait_for_update(version, STREAM_REFRESH_SECONDS)
+                yield f"data: {json.dumps(get_current_data())}\n\n"
+        finally:
+            _stream_slots.release()  # Also runs when the client disconnects
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/esp32/stats')
 def esp32_stats():
     """Get ESP32 statistics"""
-    return jsonify(get_statistics())
+    return conditional_json(get_statistics())
 
 @app.route('/api/esp32/status')
 def esp32_status():
@@ -231,14 +301,23 @@ def esp32_status():
 
 @app.route('/api/mqtt/publish', methods=['POST'])
 def mqtt_publish():
-    """Publish MQTT message (send command to ESP32)"""
+    """
+    Publish MQTT message (send command to ESP32).
+
+    Defaults to QoS 0 (fire-and-forget, no PUBACK round-trip); pass "qos": 1
+    in the body for messages that must be delivered.
+    """
     data = request.get_json()
 
     if not data or 'topic' not in data or 'message' not in data:
         return jsonify({'error': 'Missing topic or message'}), 400
 
+    qos = data.get('qos', 0)
+    if qos not in (0, 1, 2):
+        return jsonify({'error': 'qos must be 0, 1 or 2'}), 400
+
     try:
-        mqtt_client.publish(data['topic'], data['message'], qos=1)
+        mqtt_pub_client.publish(data['topic'], data['message'], qos=qos)
         logger.info(f"Published to {data['topic']}: {data['message']}")
         return jsonify({'status': 'ok'})
     except Exception as e:
@@ -247,8 +326,8 @@ def mqtt_publish():
 
 @app.route('/api/mqtt/cmd/reset', methods=['POST'])
 def mqtt_cmd_reset():
-    """Send reset command to ESP32"""
-    mqtt_client.publish('holy-calc/cmd/reset', 'true', qos=1)
+    """Send reset command to ESP32 (QoS 1, must not be dropped)"""
+    mqtt_pub_client.publish('holy-calc/cmd/reset', 'true', qos=1)
     return jsonify({'status': 'ok', 'command': 'reset'})
 
 # ============================================================================
@@ -258,114 +337,49 @@ def mqtt_cmd_reset():
 @app.route('/api/calculator/stats')
 def calculator_stats():
     """Get Holy Calculator performance statistics"""
-    try:
-        from cascade.calculator_engine import CalculatorEngine
-
-        # Placeholder - integrate with actual calculator instance
-        return jsonify({
-            'status': 'available',
-            'queries_processed': 0,
-            'sympy_success_rate': 0,
-            'llm_usage_percent': 0
-        })
-
-    except ImportError:
+    if not CALCULATOR_AVAILABLE:
         return jsonify({
             'status': 'unavailable',
             'message': 'Calculator engine not found'
         }), 404
 
+    # Placeholder - integrate with actual calculator instance
+    return jsonify({
+        'status': 'available',
+        'queries_processed': 0,
+        'sympy_success_rate': 0,
+        'llm_usage_percent': 0
+    })
+
 # ============================================================================
 # DASHBOARD HTML
 # ============================================================================
 
-@app.route('/')
-def index():
-    """Serve simple HTML dashboard"""
-    return '''
+STATIC_DIR = Path(__file__).parent / 'static'
+
+# Versioned asset URLs never change content, so browsers may cache them forever
+STATIC_MAX_AGE = 31536000
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = STATIC_MAX_AGE
+
+def asset_version(name):
+    """Content hash used to cache-bust a static asset URL"""
+    return hashlib.sha1((STATIC_DIR / name).read_bytes()).hexdigest()[:12]
+
+@app.after_request
+def cache_static_assets(response):
+    """Mark versioned static assets immutable"""
+    if request.path.startswith('/static/') and 'v' in request.args:
+        response.headers['Cache-Control'] = f'public, max-age={STATIC_MAX_AGE}, immutable'
+    return response
+
+INDEX_HTML = '''
 <!DOCTYPE html>
 <html>
 <head>
     <title>Holy Calculator Monitor</title>
     <meta charset="utf-8">
     <meta name="viewport" content="width=device-width, initial-scale=1">
-    <style>
-        body {
-            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            color: #fff;
-            margin: 0;
-            padding: 20px;
-        }
-        .container {
-            max-width: 1200px;
-            margin: 0 auto;
-        }
-        h1 {
-            text-align: center;
-            margin-bottom: 30px;
-        }
-        .grid {
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(300px, 1fr));
-            gap: 20px;
-        }
-        .card {
-            background: rgba(255, 255, 255, 0.1);
-            backdrop-filter: blur(10px);
-            border-radius: 15px;
-            padding: 20px;
-            box-shadow: 0 8px 32px rgba(0, 0, 0, 0.1);
-        }
-        .card h2 {
-            margin-top: 0;
-            border-bottom: 2px solid rgba(255, 255, 255, 0.3);
-            padding-bottom: 10px;
-        }
-        .stat {
-            display: flex;
-            justify-content: space-between;
-            padding: 8px 0;
-        }
-        .value {
-            font-weight: bold;
-        }
-        .status {
-            display: inline-block;
-            width: 10px;
-            height: 10px;
-            border-radius: 50%;
-            margin-right: 5px;
-        }
-        .status.online { background: #4ade80; }
-        .status.offline { background: #f87171; }
-        .alert {
-            background: rgba(248, 113, 113, 0.2);
-            border-left: 4px solid #f87171;
-            padding: 10px;
-            margin-top: 10px;
-            border-radius: 5px;
-        }
-        .progress-bar {
-            width: 100%;
-            height: 20px;
-            background: rgba(0, 0, 0, 0.2);
-            border-radius: 10px;
-            overflow: hidden;
-            margin-top: 5px;
-        }
-        .progress-fill {
-            height: 100%;
-            background: linear-gradient(90deg, #4ade80 0%, #22c55e 100%);
-            transition: width 0.3s;
-        }
-        .updated {
-            text-align: center;
-            margin-top: 20px;
-            font-size: 0.9em;
-            opacity: 0.8;
-        }
-    </style>
+    <link rel="stylesheet" href="/static/app.css?v={css_version}">
 </head>
 <body>
     <div class="container">
@@ -463,85 +477,22 @@ def index():
         <div class="updated" id="last-updated">Last updated: Never</div>
     </div>
 
-    <script>
-        async function updateStats() {
-            try {
-                const response = await fetch('/api/stats');
-                const data = await response.json();
-
-                // ESP32 Status
-                const esp32 = data.esp32;
-                const connected = esp32.connected;
-
-                document.getElementById('esp32-status').className = 'status ' + (connected ? 'online' : 'offline');
-                document.getElementById('esp32-conn').textContent = connected ? 'Online' : 'Offline';
-                document.getElementById('esp32-update').textContent = esp32.last_update ? new Date(esp32.last_update).toLocaleTimeString() : '-';
-
-                // Battery
-                if (esp32.battery.voltage) {
-                    document.getElementById('battery-voltage').textContent = esp32.battery.voltage.toFixed(2) + ' V';
-                    document.getElementById('battery-current').textContent = esp32.battery.current.toFixed(0) + ' mA';
-                    document.getElementById('battery-power').textContent = esp32.battery.power.toFixed(0) + ' mW';
-                    document.getElementById('battery-percent').textContent = esp32.battery.percent + '%';
-                    document.getElementById('battery-bar').style.width = esp32.battery.percent + '%';
-
-                    if (esp32.battery_runtime_hours) {
-                        document.getElementById('battery-runtime').textContent = esp32.battery_runtime_hours.toFixed(1) + ' hours';
-                    }
-
-                    // Alerts
-                    if (esp32.alerts.battery_critical) {
-                        document.getElementById('battery-alert').innerHTML = '<div class="alert">⚠️ CRITICAL: Battery critically low!</div>';
-                    } else if (esp32.alerts.battery_low) {
-                        document.getElementById('battery-alert').innerHTML = '<div class="alert">⚠️ WARNING: Battery low</div>';
-                    } else {
-                        document.getElementById('battery-alert').innerHTML = '';
-                    }
-                }
-
-                // Environment
-                if (esp32.environment.temperature) {
-                    document.getElementById('env-temp').textContent = esp32.environment.temperature.toFixed(1) + ' °C';
-                    document.getElementById('env-humidity').textContent = esp32.environment.humidity.toFixed(0) + ' %';
-                    document.getElementById('env-pressure').textContent = esp32.environment.pressure.toFixed(0) + ' hPa';
-
-                    if (esp32.alerts.temp_critical || esp32.alerts.temp_high) {
-                        document.getElementById('temp-alert').innerHTML = '<div class="alert">🔥 Temperature high!</div>';
-                    } else {
-                        document.getElementById('temp-alert').innerHTML = '';
-                    }
-                }
-
-                // Raspberry Pi
-                document.getElementById('pi-cpu').textContent = data.cpu.percent + '%';
-                document.getElementById('pi-cpu-bar').style.width = data.cpu.percent + '%';
-                document.getElementById('pi-mem').textContent = data.memory.used.toFixed(1) + ' / ' + data.memory.total + ' GB';
-                document.getElementById('pi-mem-bar').style.width = data.memory.percent + '%';
-
-                if (data.cpu.temperature) {
-                    document.getElementById('pi-temp').textContent = data.cpu.temperature + ' °C';
-                }
-
-                // Get ESP32 stats for message count
-                const statsResp = await fetch('/api/esp32/stats');
-                const statsData = await statsResp.json();
-                document.getElementById('esp32-msgs').textContent = statsData.messages_received;
-
-                // Update timestamp
-                document.getElementById('last-updated').textContent = 'Last updated: ' + new Date().toLocaleTimeString();
-
-            } catch (error) {
-                console.error('Error fetching stats:', error);
-            }
-        }
-
-        // Update every 2 seconds
-        updateStats();
-        setInterval(updateStats, 2000);
-    </script>
+    <script src="/static/app.js?v={js_version}"></script>
 </body>
 </html>
-'''
+'''.format(css_version=asset_version('app.css'), js_version=asset_version('app.js'))
+
+# Encoded once; the dashboard only changes on redeploy
+_INDEX_BYTES = INDEX_HTML.encode('utf-8')
+_INDEX_ETAG = hashlib.sha1(_INDEX_BYTES).hexdigest()
+
+@app.route('/')
+def index():
+    """Serve simple HTML dashboard"""
+    response = app.response_class(_INDEX_BYTES, mimetype='text/html')
+    response.set_etag(_INDEX_ETAG)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
 
 # ============================================================================
 # STARTUP
@@ -564,6 +515,7 @@ def initialize():
     logger.info("  - GET  /api/health          Health check")
     logger.info("  - GET  /api/esp32/current   Current ESP32 readings")
     logger.info("  - GET  /api/esp32/history   Historical data")
+    logger.info("  - GET  /api/esp32/stream    Live readings (Server-Sent Events)")
     logger.info("  - GET  /api/esp32/stats     ESP32 statistics")
     logger.info("  - GET  /api/esp32/status    ESP32 connection status")
     logger.info("  - POST /api/mqtt/publish    Send MQTT message")
@@ -0,0 +1,37 @@
+"""
+Gunicorn configuration for the Pi stats backends.
+
+Usage (from pi-stats-app/backend):
+    gunicorn -c gunicorn.conf.py app:app
+    gunicorn -c gunicorn.conf.py app_esp32:app
+    gunicorn -c gunicorn.conf.py app_mqtt:app
+
+Threaded workers keep connections alive between dashboard polls and ESP32
+POSTs instead of paying a TCP handshake per request like the Flask dev server.
+The ESP32 and MQTT backends always run as one worker (see below).
+"""
+
+import os
+import sys
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+
+worker_class = 'gthread'
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+keepalive = 65
+
+# The ESP32 and MQTT backends keep readings, history and stats in process
+# memory, so a second worker would split them between processes (the MQTT
+# backend also subscribes with a fixed client ID). They must run as a single
+# worker; only the stateless app.py honours GUNICORN_WORKERS. Nothing is
+# preloaded: the MQTT thread would start in the master and not survive the fork.
+if any('app_esp32' in arg or 'app_mqtt' in arg for arg in sys.argv):
+    workers = 1
+
+
+def post_worker_init(worker):
+    """Start the MQTT subscriber inside the worker that serves app_mqtt."""
+    app_mqtt = sys.modules.get('app_mqtt')
+    if app_mqtt is not None:
+        app_mqtt.initialize()
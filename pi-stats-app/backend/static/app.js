@@ -0,0 +1,77 @@
+function renderEsp32(esp32) {
+    // ESP32 Status
+    const connected = esp32.connected;
+
+    document.getElementById('esp32-status').className = 'status ' + (connected ? 'online' : 'offline');
+    document.getElementById('esp32-conn').textContent = connected ? 'Online' : 'Offline';
+    document.getElementById('esp32-update').textContent = esp32.last_update ? new Date(esp32.last_update).toLocaleTimeString() : '-';
+
+    // Battery
+    if (esp32.battery.voltage) {
+        document.getElementById('battery-voltage').textContent = esp32.battery.voltage.toFixed(2) + ' V';
+        document.getElementById('battery-current').textContent = esp32.battery.current.toFixed(0) + ' mA';
+        document.getElementById('battery-power').textContent = esp32.battery.power.toFixed(0) + ' mW';
+        document.getElementById('battery-percent').textContent = esp32.battery.percent + '%';
+        document.getElementById('battery-bar').style.width = esp32.battery.percent + '%';
+
+        if (esp32.battery_runtime_hours) {
+            document.getElementById('battery-runtime').textContent = esp32.battery_runtime_hours.toFixed(1) + ' hours';
+        }
+
+        // Alerts
+        if (esp32.alerts.battery_critical) {
+            document.getElementById('battery-alert').innerHTML = '<div class="alert">⚠️ CRITICAL: Battery critically low!</div>';
+        } else if (esp32.alerts.battery_low) {
+            document.getElementById('battery-alert').innerHTML = '<div class="alert">⚠️ WARNING: Battery low</div>';
+        } else {
+            document.getElementById('battery-alert').innerHTML = '';
+        }
+    }
+
+    // Environment
+    if (esp32.environment.temperature) {
+        document.getElementById('env-temp').textContent = esp32.environment.temperature.toFixed(1) + ' °C';
+        document.getElementById('env-humidity').textContent = esp32.environment.humidity.toFixed(0) + ' %';
+        document.getElementById('env-pressure').textContent = esp32.environment.pressure.toFixed(0) + ' hPa';
+
+        if (esp32.alerts.temp_critical || esp32.alerts.temp_high) {
+            document.getElementById('temp-alert').innerHTML = '<div class="alert">🔥 Temperature high!</div>';
+        } else {
+            document.getElementById('temp-alert').innerHTML = '';
+        }
+    }
+}
+
+async function updateStats() {
+    try {
+        const response = await fetch('/api/stats');
+        const data = await response.json();
+
+        // Raspberry Pi
+        document.getElementById('pi-cpu').textContent = data.cpu.percent + '%';
+        document.getElementById('pi-cpu-bar').style.width = data.cpu.percent + '%';
+        document.getElementById('pi-mem').textContent = data.memory.used.toFixed(1) + ' / ' + data.memory.total + ' GB';
+        document.getElementById('pi-mem-bar').style.width = data.memory.percent + '%';
+
+        if (data.cpu.temperature) {
+            document.getElementById('pi-temp').textContent = data.cpu.temperature + ' °C';
+        }
+
+        // ESP32 message count comes with the same response
+        document.getElementById('esp32-msgs').textContent = data.esp32.stats.messages_received;
+
+        // Update timestamp
+        document.getElementById('last-updated').textContent = 'Last updated: ' + new Date().toLocaleTimeString();
+
+    } catch (error) {
+        console.error('Error fetching stats:', error);
+    }
+}
+
+// ESP32 readings are pushed as they arrive over MQTT
+const esp32Stream = new EventSource('/api/esp32/stream');
+esp32Stream.onmessage = (event) => renderEsp32(JSON.parse(event.data));
+
+// Pi stats have no event source, update every 2 seconds
+updateStats();
+setInterval(updateStats, 2000);
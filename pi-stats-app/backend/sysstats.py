@@ -0,0 +1,39 @@
+"""
+System readings shared by the Pi stats backends (app, app_esp32, app_mqtt).
+"""
+
+import atexit
+import os
+
+# Thermal sensor stays open for the life of the process so each reading is a
+# single pread() instead of open/read/close (None on hosts without the sensor)
+try:
+    _THERMAL_FD = os.open('/sys/class/thermal/thermal_zone0/temp', os.O_RDONLY)
+    atexit.register(os.close, _THERMAL_FD)
+except OSError:
+    _THERMAL_FD = None
+
+
+def get_cpu_temperature():
+    """Get CPU temperature - works on Raspberry Pi"""
+    if _THERMAL_FD is None:
+        return None
+    try:
+        return round(int(os.pread(_THERMAL_FD, 16, 0)) / 1000.0, 1)
+    except (OSError, ValueError):
+        return None
+
+
+# Byte scaling for the stats payload (powers of two, so multiplying is exact)
+_GB = 1.0 / (1 << 30)
+_MB = 1.0 / (1 << 20)
+
+
+def gb(n):
+    """Bytes to GB, 2 decimals"""
+    return round(n * _GB, 2)
+
+
+def mb(n):
+    """Bytes to MB, 2 decimals"""
+    return round(n * _MB, 2)
@@ -9,39 +9,95 @@ across 100s of problems.
 
 import sys
 import json
+import random
 import time
 from pathlib import Path
 from collections import defaultdict
+from itertools import zip_longest
+
+try:
+    import orjson
+except ImportError:  # Optional: fall back to the stdlib codec
+    orjson = None
 
 sys.path.insert(0, str(Path(__file__).parent / 'scripts' / 'cascade'))
+sys.path.insert(0, str(Path(__file__).parent / 'scripts'))
 
 from pedagogical_wrapper import PedagogicalWrapper
 from response_validator import ResponseValidator
 from intent_classifier import UserIntent
+from json_io import write_json
+
+# Fixed seed so query phrasings and samples are identical between runs
+DEFAULT_SEED = 0xC0FFEE
+
+# Tutoring phrasings for test queries; only the chosen one gets formatted
+_PHRASING_TEMPLATES = (
+    "How do I {}?",
+    "Help me with: {}",
+    "{}",
+    "Can you guide me through {}?",
+    "What is {}?",
+)
+
+
+def load_json(path):
+    """Read a JSON file (orjson when available)."""
+    if orjson is not None:
+        return orjson.loads(Path(path).read_bytes())
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
 
 
 class ComprehensiveTester:
     """Runs comprehensive tests on full test bank."""
 
-    def __init__(self, testbank_path='test_data/comprehensive_integration_testbank.json'):
+    def __init__(self, testbank_path='test_data/comprehensive_integration_testbank.json',
+                 seed=DEFAULT_SEED):
         """Initialize tester."""
         self.wrapper = PedagogicalWrapper()
         self.validator = ResponseValidator()
+        self.rng = random.Random(seed)
+
+        # prepare_prompt() results by query; classification is deterministic,
+        # so repeated phrasings of the same problem are only classified once
+        self._prompt_cache = {}
+
+        # (query, prompt_result) per problem from test 1, reused by tests 2/3
+        self._prepared = {}
 
         # Load test bank
         self.problems = self._load_testbank(testbank_path)
         print(f"✓ Loaded {len(self.problems)} problems from test bank")
 
-        # Results tracking
+        # Problems grouped by difficulty (missing difficulty counts as 3)
+        self._by_difficulty = defaultdict(list)
+        for problem in self.problems:
+            self._by_difficulty[problem.get('difficulty', 3)].append(problem)
+        self._difficulties = sorted(self._by_difficulty)
+
+        # Shared stratified pool for the sampled tests (see prepare_samples)
+        self._samples = None
+        self._samples_n = 0
+
+        # Results tracking; one stats entry per difficulty/source/category in
+        # the bank up front, so the classification loop never creates one
+        sources = dict.fromkeys(p.get('source', 'Unknown') for p in self.problems)
+        categories = dict.fromkeys(p.get('category', 'general') for p in self.problems)
         self.results = {
             'total_tested': 0,
-            'by_difficulty': defaultdict(lambda: {'total': 0, 'tutoring_enabled': 0}),
-            'by_source': defaultdict(lambda: {'total': 0, 'tutoring_enabled': 0}),
-            'by_category': defaultdict(lambda: {'total': 0, 'tutoring_enabled': 0}),
+            'by_difficulty': self._new_stats(self._by_difficulty),
+            'by_source': self._new_stats(sources),
+            'by_category': self._new_stats(categories),
             'intent_distribution': defaultdict(int),
             'tutoring_mode_rate': 0,
         }
 
+    @staticmethod
+    def _new_stats(keys):
+        """Zeroed {'total', 'tutoring_enabled'} counters for each key."""
+        return {key: {'total': 0, 'tutoring_enabled': 0} for key in keys}
+
     def _load_testbank(self, path):
         """Load test bank from JSON."""
         testbank_file = Path(path)
@@ -51,10 +107,7 @@ class ComprehensiveTester:
             print(f"   Run: python build_comprehensive_testbank.py")
             sys.exit(1)
 
-        with open(testbank_file, 'r', encoding='utf-8') as f:
-            problems = json.load(f)
-
-        return problems
+        return load_json(testbank_file)
 
     def test_intent_classification(self, sample_size=None):
         """Test intent classification on all problems."""
@@ -66,38 +119,36 @@ class ComprehensiveTester:
 
         tutoring_enabled_count = 0
 
-        for i, problem in enumerate(problems_to_test, 1):
-            # Convert problem to natural tutoring query
-            query = self._format_as_student_query(problem['problem'])
+        # Convert problems to natural tutoring queries and classify them in one batch
+        queries = [self._format_as_student_query(p['problem']) for p in problems_to_test]
+        prompt_results = self._prepare_prompts(queries)
 
-            # Classify intent
-            prompt_result = self.wrapper.prepare_prompt(query)
+        intent_counts = self.results['intent_distribution']
+        by_difficulty = self.results['by_difficulty']
+        by_source = self.results['by_source']
+        by_category = self.results['by_category']
 
-            # Track results
-            self.results['total_tested'] += 1
-            self.results['intent_distribution'][prompt_result['intent'].value] += 1
+        for i, (problem, query, prompt_result) in enumerate(zip(problems_to_test, queries, prompt_results), 1):
+            self._prepared[id(problem)] = (query, prompt_result)
 
-            if prompt_result['tutoring_mode']:
-                tutoring_enabled_count += 1
+            # Track results
+            intent_counts[prompt_result['intent'].value] += 1
+            inc = 1 if prompt_result['tutoring_mode'] else 0
+            tutoring_enabled_count += inc
 
             # Update by-category stats
-            difficulty = problem.get('difficulty', 3)
-            source = problem.get('source', 'Unknown')
-            category = problem.get('category', 'general')
-
-            self.results['by_difficulty'][difficulty]['total'] += 1
-            self.results['by_source'][source]['total'] += 1
-            self.results['by_category'][category]['total'] += 1
+            for stats in (by_difficulty[problem.get('difficulty', 3)],
+                          by_source[problem.get('source', 'Unknown')],
+                          by_category[problem.get('category', 'general')]):
+                stats['total'] += 1
+                stats['tutoring_enabled'] += inc
 
-            if prompt_result['tutoring_mode']:
-                self.results['by_difficulty'][difficulty]['tutoring_enabled'] += 1
-                self.results['by_source'][source]['tutoring_enabled'] += 1
-                self.results['by_category'][category]['tutoring_enabled'] += 1
-
-            # Show progress
+            # Show progress (rewritten in place on one line)
             if i % 50 == 0:
-                print(f"  Processed {i}/{len(problems_to_test)} problems...")
+                sys.stdout.write(f"  Processed {i}/{len(problems_to_test)} problems...\r")
+                sys.stdout.flush()
 
+        self.results['total_tested'] += len(problems_to_test)
         self.results['tutoring_mode_rate'] = tutoring_enabled_count / len(problems_to_test)
 
         print(f"\n✓ Tested {len(problems_to_test)} problems")
@@ -110,24 +161,28 @@ class ComprehensiveTester:
         print("=" * 70)
 
         # Get diverse sample across difficulties
-        samples = self._get_stratified_sample(sample_size)
+        samples = self._get_samples(sample_size)
 
         for i, problem in enumerate(samples, 1):
-            query = self._format_as_student_query(problem['problem'])
-            prompt_result = self.wrapper.prepare_prompt(query)
-
-            print(f"\nSample {i}/{len(samples)}")
-            print(f"  Problem: {problem['problem'][:60]}...")
-            print(f"  Difficulty: {problem.get('difficulty', 'N/A')}")
-            print(f"  Intent: {prompt_result['intent'].value}")
-            print(f"  Mode: {prompt_result['mode'].value}")
-            print(f"  Tutoring: {'ENABLED' if prompt_result['tutoring_mode'] else 'DISABLED'}")
-            print(f"  Prompt length: {len(prompt_result['prompt'])} chars")
+            query, prompt_result = self._query_and_prompt(problem)
+
+            lines = [
+                f"\nSample {i}/{len(samples)}",
+                f"  Problem: {problem['problem'][:60]}...",
+                f"  Difficulty: {problem.get('difficulty', 'N/A')}",
+                f"  Intent: {prompt_result['intent'].value}",
+                f"  Mode: {prompt_result['mode'].value}",
+                f"  Tutoring: {'ENABLED' if prompt_result['tutoring_mode'] else 'DISABLED'}",
+                f"  Prompt length: {len(prompt_result['prompt'])} chars",
+            ]
 
             # Check for pedagogical rules in tutoring prompts
             if prompt_result['tutoring_mode']:
                 has_rules = 'CRITICAL RULES' in prompt_result['prompt'] or 'RULES' in prompt_result['prompt']
-                print(f"  Contains rules: {has_rules}")
+                lines.append(f"  Contains rules: {has_rules}")
+
+            # One write per sample instead of one per line
+            print('\n'.join(lines))
 
     def test_validation_on_responses(self, sample_size=20):
         """Test response validation on simulated responses."""
@@ -135,7 +190,7 @@ class ComprehensiveTester:
         print("TEST 3: RESPONSE VALIDATION")
         print("=" * 70)
 
-        samples = self._get_stratified_sample(sample_size)
+        samples = self._get_samples(sample_size)
 
         good_responses = 0
         answer_leakage = 0
@@ -159,8 +214,7 @@ class ComprehensiveTester:
         ]
 
         for i, problem in enumerate(samples, 1):
-            query = self._format_as_student_query(problem['problem'])
-            prompt_result = self.wrapper.prepare_prompt(query)
+            query, prompt_result = self._query_and_prompt(problem)
 
             if not prompt_result['tutoring_mode']:
                 continue
@@ -196,32 +250,56 @@ class ComprehensiveTester:
         print(f"  Good responses passed: {good_responses}")
         print(f"  Answer leakage detected: {answer_leakage}")
 
+    def _query_and_prompt(self, problem):
+        """Test 1's (query, prompt_result) for a problem, or a fresh pair."""
+        prepared = self._prepared.get(id(problem))
+        if prepared is None:
+            query = self._format_as_student_query(problem['problem'])
+            prepared = (query, self._prepare_prompt(query))
+        return prepared
+
+    def _prepare_prompt(self, query):
+        """Memoized wrapper.prepare_prompt()."""
+        prompt_result = self._prompt_cache.get(query)
+        if prompt_result is None:
+            prompt_result = self.wrapper.prepare_prompt(query)
+            self._prompt_cache[query] = prompt_result
+        return prompt_result
+
+    def _prepare_prompts(self, queries):
+        """Memoized wrapper.prepare_prompts_batch()."""
+        missing = [q for q in dict.fromkeys(queries) if q not in self._prompt_cache]
+        self._prompt_cache.update(zip(missing, self.wrapper.prepare_prompts_batch(missing)))
+        return [self._prompt_cache[q] for q in queries]
+
     def _format_as_student_query(self, problem_text):
         """Convert problem statement to natural student query."""
         # Add tutoring phrasing to some problems
-        phrasings = [
-            f"How do I {problem_text}?",
-            f"Help me with: {problem_text}",
-            f"{problem_text}",
-            f"Can you guide me through {problem_text}?",
-            f"What is {problem_text}?",
-        ]
+        template = _PHRASING_TEMPLATES[self.rng.randrange(len(_PHRASING_TEMPLATES))]
+        return template.format(problem_text)
+
+    def prepare_samples(self, max_n):
+        """Draw one stratified pool that the sampled tests slice from."""
+        self._samples = self._get_stratified_sample(max_n)
+        self._samples_n = max_n
 
-        import random
-        return random.choice(phrasings)
+    def _get_samples(self, n):
+        """First n of the prepared pool, or a fresh sample if it is too small."""
+        if self._samples is not None and n <= self._samples_n:
+            return self._samples[:n]
+        return self._get_stratified_sample(n)
 
     def _get_stratified_sample(self, n):
         """Get stratified sample across difficulties."""
-        samples = []
-        difficulties = sorted(set(p.get('difficulty', 3) for p in self.problems))
+        per_difficulty = max(1, n // len(self._difficulties))
 
-        per_difficulty = max(1, n // len(difficulties))
-
-        for diff in difficulties:
-            diff_problems = [p for p in self.problems if p.get('difficulty') == diff]
-            import random
-            samples.extend(random.sample(diff_problems, min(per_difficulty, len(diff_problems))))
+        strata = []
+        for diff in self._difficulties:
+            diff_problems = self._by_difficulty[diff]
+            strata.append(self.rng.sample(diff_problems, min(per_difficulty, len(diff_problems))))
 
+        # Round-robin across difficulties so any prefix is still stratified
+        samples = [p for round_ in zip_longest(*strata) for p in round_ if p is not None]
         return samples[:n]
 
     def print_summary(self):
@@ -256,18 +334,17 @@ class ComprehensiveTester:
         output_path = Path(output_file)
         output_path.parent.mkdir(parents=True, exist_ok=True)
 
-        # Convert defaultdict to regular dict for JSON
+        # Plain dicts for JSON, leaving out entries no tested problem touched
         results_serializable = {
             'total_tested': self.results['total_tested'],
             'tutoring_mode_rate': self.results['tutoring_mode_rate'],
             'intent_distribution': dict(self.results['intent_distribution']),
-            'by_difficulty': {k: dict(v) for k, v in self.results['by_difficulty'].items()},
-            'by_source': {k: dict(v) for k, v in self.results['by_source'].items()},
-            'by_category': {k: dict(v) for k, v in self.results['by_category'].items()},
+            'by_difficulty': {k: dict(v) for k, v in self.results['by_difficulty'].items() if v['total']},
+            'by_source': {k: dict(v) for k, v in self.results['by_source'].items() if v['total']},
+            'by_category': {k: dict(v) for k, v in self.results['by_category'].items() if v['total']},
         }
 
-        with open(output_path, 'w') as f:
-            json.dump(results_serializable, f, indent=2)
+        write_json(output_path, results_serializable)
 
         print(f"\n✓ Results saved to {output_path}")
 
@@ -287,6 +364,9 @@ def main():
     # Test 1: Intent classification on all problems
     tester.test_intent_classification(sample_size=None)  # Test all
 
+    # One stratified pool shared by tests 2 and 3
+    tester.prepare_samples(max_n=20)
+
     # Test 2: Prompt generation quality on sample
     tester.test_prompt_generation(sample_size=10)
 
@@ -15,13 +15,70 @@ Sections covered:
 - 5.7: Integrals Resulting in Inverse Trigonometric Functions
 """
 
-import requests
-from bs4 import BeautifulSoup
-import json
+from bs4 import BeautifulSoup, SoupStrainer
 import re
-import time
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import lru_cache
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).parent.parent / 'scripts'))
+
+from json_io import write_json
+from scraper_utils import RateLimiter, fetch, make_session
+
+try:
+    import lxml  # noqa: F401 -- C parser, far faster than html.parser
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+# At most one live request per interval so we don't hammer openstax.org
+REQUEST_DELAY_SECONDS = 2
+
+# Sections fetched concurrently (parsing overlaps the rate-limited fetches)
+MAX_WORKERS = 4
+
+# Only exercise blocks are read, so the rest of the page is never built into a tree
+_EXERCISE_STRAINER = SoupStrainer('div', class_='os-exercise')
+
+# Text-processing patterns, compiled once instead of per problem
+_WHITESPACE_RE = re.compile(r'\s+')
+_LEADING_NUMBER_RE = re.compile(r'^\d+\.\s*')
+_ANSWER_PATTERNS = [re.compile(p, re.IGNORECASE) for p in (
+    r'(?:answer|result|solution)(?:\s+is)?:?\s*(.+?)(?:\.|$)',
+    r'=\s*([^=]+?)(?:\+\s*C|\.|$)',
+    r'\\boxed\{([^}]+)\}',
+)]
+_TRIG_POWER_RE = re.compile(r'sin\^\d+|cos\^\d+')
+
+# (keywords, difficulty bump): each group counts once if any keyword appears
+_DIFFICULTY_KEYWORDS = (
+    (('substitution', 'u-sub'), 1),
+    (('by parts',), 2),
+    (('prove', 'show that', 'verify'), 1),
+)
+
+
+@lru_cache(maxsize=2048)
+def estimate_difficulty(problem_text, min_diff, max_diff):
+    """
+    Difficulty of a problem within its section's (min_diff, max_diff) range.
+
+    Cached per process, so repeated or cross-referenced exercises and
+    re-scraped sections are only scored once.
+    """
+    # Increase based on complexity indicators
+    text_lower = problem_text.lower()
+    difficulty = min_diff + sum(bump for keywords, bump in _DIFFICULTY_KEYWORDS
+                                if any(word in text_lower for word in keywords))
+    difficulty += _TRIG_POWER_RE.search(problem_text) is not None  # Trig powers
+    difficulty += 'ln' in problem_text or 'log' in problem_text
+
+    # Cap at section max
+    return min(difficulty, max_diff)
+
 
 class OpenStaxScraper:
     """Scraper for OpenStax Calculus integration problems."""
@@ -71,10 +128,9 @@ class OpenStaxScraper:
         """Initialize scraper."""
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Educational Research Bot)'
-        })
+
+        self.session = make_session(self.output_dir / '.openstax_http_cache', timedelta(days=30))
+        self.rate_limiter = RateLimiter(REQUEST_DELAY_SECONDS)
 
     def scrape_section(self, section_id):
         """
@@ -89,15 +145,12 @@ class OpenStaxScraper:
         section_info = self.INTEGRATION_SECTIONS[section_id]
         url = f"{self.BASE_URL}/{section_info['slug']}"
 
-        print(f"\n{'='*60}")
-        print(f"Scraping: {section_id} - {section_info['title']}")
-        print(f"URL: {url}")
-        print('='*60)
+        # Sections are scraped concurrently, so every line names its section
+        print(f"[{section_id}] Scraping: {section_info['title']} ({url})")
 
         try:
-            response = self.session.get(url, timeout=30)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
+            response = fetch(self.session, url, self.rate_limiter)
+            soup = BeautifulSoup(response.text, HTML_PARSER, parse_only=_EXERCISE_STRAINER)
 
             problems = []
 
@@ -105,7 +158,7 @@ class OpenStaxScraper:
             # Look for practice problems in the "Section Exercises" area
             exercise_divs = soup.find_all('div', class_='os-exercise')
 
-            print(f"Found {len(exercise_divs)} exercise containers")
+            print(f"[{section_id}] Found {len(exercise_divs)} exercise containers")
 
             for i, div in enumerate(exercise_divs, 1):
                 problem_data = self._extract_problem(div, section_id, i)
@@ -114,13 +167,13 @@ class OpenStaxScraper:
 
                     # Show progress
                     if i % 10 == 0:
-                        print(f"  Processed {i}/{len(exercise_divs)} exercises...")
+                        print(f"[{section_id}]   Processed {i}/{len(exercise_divs)} exercises...")
 
-            print(f"✓ Extracted {len(problems)} problems from section {section_id}")
+            print(f"[{section_id}] ✓ Extracted {len(problems)} problems")
             return problems
 
         except Exception as e:
-            print(f"✗ Error scraping section {section_id}: {e}")
+            print(f"[{section_id}] ✗ Error scraping section: {e}")
             return []
 
     def _extract_problem(self, exercise_div, section_id, problem_num):
@@ -131,13 +184,13 @@ class OpenStaxScraper:
             if not problem_container:
                 return None
 
-            problem_text = self._clean_text(problem_container.get_text())
+            problem_text = self._container_text(problem_container)
 
             # Try to find solution
             solution_container = exercise_div.find('div', class_='os-solution-container')
             solution_text = None
             if solution_container:
-                solution_text = self._clean_text(solution_container.get_text())
+                solution_text = self._container_text(solution_container)
 
             # Extract just the final answer if possible
             answer = self._extract_answer(solution_text) if solution_text else None
@@ -158,17 +211,24 @@ class OpenStaxScraper:
             }
 
         except Exception as e:
-            print(f"  Warning: Error extracting problem {problem_num}: {e}")
+            print(f"[{section_id}]   Warning: Error extracting problem {problem_num}: {e}")
             return None
 
+    def _container_text(self, container):
+        """Cleaned text of a problem/solution div, skipping its buttons."""
+        # Drop "Show Solution" toggles before get_text() walks the subtree
+        for button in container.find_all('button'):
+            button.decompose()
+        return self._clean_text(container.get_text())
+
     def _clean_text(self, text):
         """Clean extracted text."""
         # Remove extra whitespace
-        text = re.sub(r'\s+', ' ', text)
-        # Remove "Show Solution" buttons
-        text = re.sub(r'Show Solution', '', text)
+        text = _WHITESPACE_RE.sub(' ', text)
+        # Remove "Show Solution" labels not wrapped in a <button>
+        text = text.replace('Show Solution', '')
         # Remove problem numbers at start
-        text = re.sub(r'^\d+\.\s*', '', text)
+        text = _LEADING_NUMBER_RE.sub('', text)
         return text.strip()
 
     def _extract_answer(self, solution_text):
@@ -177,14 +237,8 @@ class OpenStaxScraper:
             return None
 
         # Look for common answer patterns
-        patterns = [
-            r'(?:answer|result|solution)(?:\s+is)?:?\s*(.+?)(?:\.|$)',
-            r'=\s*([^=]+?)(?:\+\s*C|\.|$)',
-            r'\\boxed\{([^}]+)\}',
-        ]
-
-        for pattern in patterns:
-            match = re.search(pattern, solution_text, re.IGNORECASE)
+        for pattern in _ANSWER_PATTERNS:
+            match = pattern.search(solution_text)
             if match:
                 answer = match.group(1).strip()
                 # Limit length
@@ -197,33 +251,15 @@ class OpenStaxScraper:
         """Estimate problem difficulty based on content."""
         # Base difficulty from section
         min_diff, max_diff = self.INTEGRATION_SECTIONS[section_id]['difficulty_range']
-        difficulty = min_diff
-
-        # Increase based on complexity indicators
-        if 'substitution' in problem_text.lower() or 'u-sub' in problem_text.lower():
-            difficulty += 1
-        if 'by parts' in problem_text.lower():
-            difficulty += 2
-        if any(word in problem_text.lower() for word in ['prove', 'show that', 'verify']):
-            difficulty += 1
-        if re.search(r'sin\^\d+|cos\^\d+', problem_text):  # Trig powers
-            difficulty += 1
-        if 'ln' in problem_text or 'log' in problem_text:
-            difficulty += 1
-
-        # Cap at section max
-        return min(difficulty, max_diff)
+        return estimate_difficulty(problem_text, min_diff, max_diff)
 
     def scrape_all_sections(self):
-        """Scrape all integration sections."""
+        """Scrape all integration sections (concurrently, results in section order)."""
         all_problems = []
 
-        for section_id in self.INTEGRATION_SECTIONS.keys():
-            problems = self.scrape_section(section_id)
-            all_problems.extend(problems)
-
-            # Be polite - don't hammer the server
-            time.sleep(2)
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            for problems in executor.map(self.scrape_section, self.INTEGRATION_SECTIONS):
+                all_problems.extend(problems)
 
         return all_problems
 
@@ -231,8 +267,7 @@ class OpenStaxScraper:
         """Save problems to JSON file."""
         output_path = self.output_dir / filename
 
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(problems, f, indent=2, ensure_ascii=False)
+        write_json(output_path, problems)
 
         print(f"\n✓ Saved {len(problems)} problems to {output_path}")
 
@@ -261,8 +296,7 @@ class OpenStaxScraper:
             summary['by_difficulty'][diff] = summary['by_difficulty'].get(diff, 0) + 1
 
         summary_path = self.output_dir / 'openstax_summary.json'
-        with open(summary_path, 'w') as f:
-            json.dump(summary, f, indent=2)
+        write_json(summary_path, summary)
 
         print(f"\nSummary:")
         print(f"  Total problems: {summary['total_problems']}")
@@ -287,7 +321,6 @@ def main():
     scraper = OpenStaxScraper()
 
     # Option: scrape specific section for testing
-    import sys
     if len(sys.argv) > 1:
         section_id = sys.argv[1]
         if section_id in scraper.INTEGRATION_SECTIONS:
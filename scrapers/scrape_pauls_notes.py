@@ -12,12 +12,70 @@ Sections:
 - Substitution Rule (Definite)
 """
 
-import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4.element import CData, NavigableString, Tag
+from requests.adapters import HTTPAdapter
 import json
+import os
 import re
+import string
+import sys
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 from pathlib import Path
-import time
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'scripts'))
+
+from json_io import JSON_WRITE_BUFFER, write_json
+from scraper_utils import RateLimiter, fetch, make_session
+
+try:
+    import orjson
+except ImportError:  # Optional: fall back to the stdlib codec
+    orjson = None
+
+try:
+    import lxml  # noqa: F401 -- C parser, far faster than html.parser
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+# At most one request per interval so we don't hammer lamar.edu
+REQUEST_DELAY_SECONDS = 1
+
+# Sections fetched concurrently over the session's keep-alive connections
+MAX_WORKERS = 4
+
+# Only the problem lists are read, so the rest of the page is never built into a tree
+_PROBLEM_LIST_STRAINER = SoupStrainer('ol', class_='practice-problems')
+
+# String node types that get_text() includes (not comments, scripts, styles)
+_TEXT_TYPES = (NavigableString, CData)
+
+# Labels for the parts of multi-part problems: '(a) ', '(b) ', ...
+_PART_LABELS = tuple(f'({letter}) ' for letter in string.ascii_lowercase)
+
+# Text-processing patterns, compiled once instead of per problem
+_WHITESPACE_RE = re.compile(r'\s+')
+_SHOW_HIDE_RE = re.compile(r'(Show|Hide)\s+Solution')
+_SOLUTION_HEADER_RE = re.compile(r'^Solution\s*:?\s*', re.IGNORECASE)
+_ANSWER_PATTERNS = [re.compile(p, re.IGNORECASE) for p in (
+    r'Answer\s*:?\s*(.+?)(?:\.|$)',
+    r'=\s*([^=]+?)\s*(?:\+\s*[cC]|\.|$)',  # Captures before +C
+    r'Therefore,?\s+(.+?)(?:\.|$)',
+)]
+# Difficulty indicators; each named group adds 1 however often it matches
+_DIFFICULTY_RE = re.compile(
+    r'(?P<trig>(?:sin|cos|tan)\^\d+)|(?P<log>ln|log)|(?P<exp>e\^)|(?P<sqrt>sqrt|√)'
+)
+
+
+def jsonl_line(record):
+    """One JSON Lines record as UTF-8 bytes (orjson when available)."""
+    if orjson is not None:
+        return orjson.dumps(record) + b'\n'
+    return (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
 
 
 class PaulsNotesScraper:
@@ -52,32 +110,34 @@ class PaulsNotesScraper:
         """Initialize scraper."""
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Educational Research Bot)'
-        })
+
+        self.session = make_session(self.output_dir / '.pauls_http_cache', timedelta(days=1))
+        # One host; keep a pooled keep-alive connection per worker
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=MAX_WORKERS))
+        self.rate_limiter = RateLimiter(REQUEST_DELAY_SECONDS)
 
     def scrape_section(self, section_key):
         """Scrape a specific section."""
         section_info = self.SECTIONS[section_key]
         url = self.BASE_URL + section_info['url']
 
-        print(f"\n{'='*60}")
-        print(f"Scraping: {section_info['title']}")
-        print(f"URL: {url}")
-        print('='*60)
+        # Sections are scraped concurrently, so every line names its section
+        print(f"[{section_key}] Scraping: {section_info['title']} ({url})")
 
         try:
-            response = self.session.get(url, timeout=30)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
+            response = fetch(self.session, url, self.rate_limiter)
+            # Hand the parser raw bytes: it decodes them in C, honouring the
+            # page's <meta charset> unless the server declared a charset
+            declared = 'charset' in response.headers.get('Content-Type', '')
+            soup = BeautifulSoup(response.content, HTML_PARSER, parse_only=_PROBLEM_LIST_STRAINER,
+                                 from_encoding=response.encoding if declared else None)
 
             problems = []
 
             # Paul's uses <ol class="practice-problems"> with <li> for each problem
             problem_lists = soup.find_all('ol', class_='practice-problems')
 
-            print(f"Found {len(problem_lists)} problem lists")
+            print(f"[{section_key}] Found {len(problem_lists)} problem lists")
 
             problem_num = 0
             for problem_list in problem_lists:
@@ -90,11 +150,11 @@ class PaulsNotesScraper:
                     if problem_data:
                         problems.append(problem_data)
 
-            print(f"✓ Extracted {len(problems)} problems from {section_key}")
+            print(f"[{section_key}] ✓ Extracted {len(problems)} problems")
             return problems
 
         except Exception as e:
-            print(f"✗ Error scraping {section_key}: {e}")
+            print(f"[{section_key}] ✗ Error scraping section: {e}")
             return []
 
     def _extract_problem(self, li_element, section_key, problem_num):
@@ -102,32 +162,16 @@ class PaulsNotesScraper:
         try:
             section_info = self.SECTIONS[section_key]
 
-            # Clone the li to avoid modifying original
-            li = li_element
-
-            # Check if this is a multi-part problem
-            parts_list = li.find('ol', class_='example_parts_list')
-
-            # Get problem text (remove solution link first)
-            solution_link = li.find('a', class_='practice-soln-link')
-            solution_url = None
-            if solution_link:
-                solution_url = solution_link.get('href')
-                solution_link.decompose()  # Remove from tree
+            intro, parts = self._collect_text(li_element)
+            intro_text = self._clean_text(''.join(intro))
 
             # For multi-part problems, get the intro text + parts
-            if parts_list:
-                # Get intro text
-                intro_text = li.get_text(separator=' ', strip=True).split('\n')[0]
-
-                # Get each part
-                part_items = parts_list.find_all('li')
-                parts = [self._clean_text(part.get_text()) for part in part_items]
-
-                problem_text = intro_text + ' ' + ' '.join(f'({chr(97+i)}) {part}' for i, part in enumerate(parts))
+            if parts is not None:
+                parts = [self._clean_text(''.join(part)) for part in parts]
+                problem_text = intro_text + ' ' + ' '.join(label + part for label, part in zip(_PART_LABELS, parts))
             else:
                 # Single problem - just get all text
-                problem_text = self._clean_text(li.get_text())
+                problem_text = intro_text
 
             if not problem_text or len(problem_text) < 10:
                 return None
@@ -149,17 +193,52 @@ class PaulsNotesScraper:
             }
 
         except Exception as e:
-            print(f"  Warning: Error extracting problem {problem_num}: {e}")
+            print(f"[{section_key}]   Warning: Error extracting problem {problem_num}: {e}")
             return None
 
+    def _collect_text(self, li):
+        """
+        Gather a problem <li>'s text in a single walk of its subtree.
+
+        Returns (intro, parts) as lists of strings. intro is the text outside
+        ol.example_parts_list; parts holds one list per part <li>, or is None
+        when the problem has no parts list. The solution link is skipped.
+        """
+        intro, parts = [], None
+        # (node, strings it belongs to, whether it is a parts-list item)
+        stack = [(child, intro, False) for child in reversed(li.contents)]
+
+        while stack:
+            node, sink, is_part = stack.pop()
+            if type(node) in _TEXT_TYPES:
+                sink.append(node)
+            elif isinstance(node, Tag):
+                classes = node.get('class') or ()
+                if node.name == 'a' and 'practice-soln-link' in classes:
+                    continue
+                if is_part and node.name == 'li':
+                    sink = []
+                    parts.append(sink)
+                is_list = node.name == 'ol' and 'example_parts_list' in classes
+                if is_list and parts is None:
+                    parts = []
+                stack.extend((child, sink, is_list) for child in reversed(node.contents))
+
+        return intro, parts
+
     def _clean_text(self, text):
         """Clean extracted text."""
+        # Too short to hold a Show/Hide Solution label; short problems are
+        # dropped by the caller, but short parts are kept, so still tidy them
+        if len(text) < 10:
+            return ' '.join(text.split())
+
         # Remove extra whitespace
-        text = re.sub(r'\s+', ' ', text)
+        text = _WHITESPACE_RE.sub(' ', text)
         # Remove "Show Solution" / "Hide Solution"
-        text = re.sub(r'(Show|Hide)\s+Solution', '', text)
+        text = _SHOW_HIDE_RE.sub('', text)
         # Remove "Solution" header
-        text = re.sub(r'^Solution\s*:?\s*', '', text, flags=re.IGNORECASE)
+        text = _SOLUTION_HEADER_RE.sub('', text)
         return text.strip()
 
     def _extract_answer(self, solution_text):
@@ -168,14 +247,8 @@ class PaulsNotesScraper:
             return None
 
         # Paul's often ends with "Answer:" or puts answer after equals
-        patterns = [
-            r'Answer\s*:?\s*(.+?)(?:\.|$)',
-            r'=\s*([^=]+?)\s*(?:\+\s*[cC]|\.|$)',  # Captures before +C
-            r'Therefore,?\s+(.+?)(?:\.|$)',
-        ]
-
-        for pattern in patterns:
-            match = re.search(pattern, solution_text, re.IGNORECASE)
+        for pattern in _ANSWER_PATTERNS:
+            match = pattern.search(solution_text)
             if match:
                 answer = match.group(1).strip()
                 # Limit length (avoid grabbing whole explanation)
@@ -187,40 +260,36 @@ class PaulsNotesScraper:
     def _estimate_difficulty(self, problem_text, section_key, min_diff, max_diff):
         """Estimate difficulty."""
         difficulty = min_diff
-
-        # Complexity indicators
-        if re.search(r'sin\^\d+|cos\^\d+|tan\^\d+', problem_text):
-            difficulty += 1
-        if re.search(r'ln|log', problem_text):
-            difficulty += 1
-        if re.search(r'e\^', problem_text):
-            difficulty += 1
-        if 'sqrt' in problem_text or '√' in problem_text:
-            difficulty += 1
         if len(problem_text) > 50:  # Longer problems often harder
             difficulty += 1
 
+        # Complexity indicators, found in one scan of the text that stops
+        # as soon as the section cap is reached
+        seen = set()
+        for match in _DIFFICULTY_RE.finditer(problem_text):
+            if difficulty >= max_diff:
+                break
+            if match.lastgroup not in seen:
+                seen.add(match.lastgroup)
+                difficulty += 1
+
         return min(difficulty, max_diff)
 
+    def iter_problems(self):
+        """Yield problems section by section (scraped concurrently, in section order)."""
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            for problems in executor.map(self.scrape_section, self.SECTIONS):
+                yield from problems
+
     def scrape_all_sections(self):
         """Scrape all available sections."""
-        all_problems = []
-
-        for section_key in self.SECTIONS.keys():
-            problems = self.scrape_section(section_key)
-            all_problems.extend(problems)
-
-            # Be polite
-            time.sleep(2)
-
-        return all_problems
+        return list(self.iter_problems())
 
     def save_problems(self, problems, filename='pauls_notes_integration_problems.json'):
         """Save to JSON."""
         output_path = self.output_dir / filename
 
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(problems, f, indent=2, ensure_ascii=False)
+        write_json(output_path, problems)
 
         print(f"\n✓ Saved {len(problems)} problems to {output_path}")
 
@@ -229,26 +298,62 @@ class PaulsNotesScraper:
 
         return output_path
 
+    def save_problems_jsonl(self, problems, filename='pauls_notes_integration_problems.jsonl'):
+        """
+        Stream problems to a JSON Lines file, one problem per line.
+
+        Accepts any iterable (e.g. iter_problems()), so each section is written
+        as soon as it is scraped instead of holding every problem in memory.
+        """
+        output_path = self.output_dir / filename
+        tmp_path = output_path.with_name(output_path.name + '.tmp')
+
+        count = 0
+        with open(tmp_path, 'wb', buffering=JSON_WRITE_BUFFER) as f:
+            for problem in problems:
+                f.write(jsonl_line(problem))
+                count += 1
+        os.replace(tmp_path, output_path)
+
+        print(f"\n✓ Saved {count} problems to {output_path}")
+
+        # Summary, from a second streaming read of the file
+        self._save_summary(self.load_problems_jsonl(output_path))
+
+        return output_path
+
+    @staticmethod
+    def load_problems_jsonl(path):
+        """Yield problems from a JSON Lines file one at a time."""
+        loads = orjson.loads if orjson is not None else json.loads
+        with open(path, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    yield loads(line)
+
     def _save_summary(self, problems):
-        """Save summary stats."""
-        summary = {
-            'total_problems': len(problems),
-            'by_section': {},
-            'by_difficulty': {},
-            'with_solutions': sum(1 for p in problems if p['solution']),
-            'with_answers': sum(1 for p in problems if p['answer']),
-        }
+        """Save summary stats (single pass, so problems may be a stream)."""
+        by_section = Counter()
+        by_difficulty = Counter()
+        total = with_solutions = with_answers = 0
 
         for problem in problems:
-            section = problem['section']
-            summary['by_section'][section] = summary['by_section'].get(section, 0) + 1
+            total += 1
+            with_solutions += bool(problem['solution'])
+            with_answers += bool(problem['answer'])
+            by_section[problem['section']] += 1
+            by_difficulty[problem['difficulty']] += 1
 
-            diff = problem['difficulty']
-            summary['by_difficulty'][diff] = summary['by_difficulty'].get(diff, 0) + 1
+        summary = {
+            'total_problems': total,
+            'by_section': dict(by_section),
+            'by_difficulty': dict(by_difficulty),
+            'with_solutions': with_solutions,
+            'with_answers': with_answers,
+        }
 
         summary_path = self.output_dir / 'pauls_notes_summary.json'
-        with open(summary_path, 'w') as f:
-            json.dump(summary, f, indent=2)
+        write_json(summary_path, summary)
 
         print(f"\nSummary:")
         print(f"  Total problems: {summary['total_problems']}")
@@ -262,6 +367,14 @@ class PaulsNotesScraper:
 
 def main():
     """Main entry point."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Scrape Paul's Online Math Notes integration problems")
+    parser.add_argument('--jsonl', action='store_true',
+                        help='Stream problems to a .jsonl file instead of one JSON array '
+                             '(build_comprehensive_testbank.py reads the JSON array)')
+    args = parser.parse_args()
+
     print("=" * 70)
     print("PAUL'S ONLINE MATH NOTES - INTEGRATION PROBLEMS SCRAPER")
     print("=" * 70)
@@ -273,10 +386,12 @@ def main():
 
     # Scrape all sections
     print("\nScraping all integration sections...")
-    problems = scraper.scrape_all_sections()
-
-    # Save
-    scraper.save_problems(problems)
+    if args.jsonl:
+        # Stream each section to disk as it is scraped
+        scraper.save_problems_jsonl(scraper.iter_problems())
+    else:
+        problems = scraper.scrape_all_sections()
+        scraper.save_problems(problems)
 
     print("\n" + "=" * 70)
     print("SCRAPING COMPLETE")
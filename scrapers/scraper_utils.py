@@ -0,0 +1,62 @@
+"""
+Shared HTTP helpers for the problem scrapers.
+"""
+
+import threading
+import time
+
+import requests
+
+try:
+    import requests_cache
+except ImportError:  # Optional: without it every run re-downloads every page
+    requests_cache = None
+
+
+class RateLimiter:
+    """Thread-safe limiter allowing one call per `interval` seconds."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self):
+        """Block until the caller's slot comes up."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        time.sleep(slot - now)
+
+
+def make_session(cache_path, expire_after):
+    """
+    HTTP session identifying as the research bot.
+
+    With requests-cache installed, repeat runs are served from `cache_path`
+    on disk; after `expire_after` pages are revalidated with the server's
+    Cache-Control/ETag/Last-Modified headers.
+    """
+    if requests_cache is not None:
+        session = requests_cache.CachedSession(
+            str(cache_path),
+            expire_after=expire_after,
+            cache_control=True,
+        )
+    else:
+        session = requests.Session()
+    session.headers.update({
+        'User-Agent': 'Mozilla/5.0 (Educational Research Bot)'
+    })
+    return session
+
+
+def fetch(session, url, rate_limiter):
+    """GET a page, rate-limiting only requests that will hit the network."""
+    cache = getattr(session, 'cache', None)
+    if cache is None or not cache.contains(url=url):
+        rate_limiter.wait()
+    response = session.get(url, timeout=30)
+    response.raise_for_status()
+    return response
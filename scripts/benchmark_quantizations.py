@@ -4,7 +4,12 @@ Benchmark Q4 vs Q5 Quantizations
 Compares performance, quality, and memory usage of different quantization levels.
 """
 
+import atexit
+import os
+import re
+import resource
 import sys
+import threading
 import time
 import psutil
 from pathlib import Path
@@ -34,6 +39,77 @@ TEST_QUERIES = [
 ]
 
 
+# Quantization level from a model file name (e.g. ...-Q4_K_M.gguf)
+_QUANT_LEVEL_RE = re.compile(r'q([45])', re.IGNORECASE)
+
+# Peak memory is sampled this often (seconds) while queries run
+MEMORY_SAMPLE_INTERVAL = 0.1
+
+# On Linux, RSS is read straight from /proc/<pid>/statm (resident pages are
+# its second field) instead of going through psutil's memory_info()
+_PAGE_SIZE = resource.getpagesize()
+try:
+    _SELF_STATM_FD = os.open('/proc/self/statm', os.O_RDONLY)
+    atexit.register(os.close, _SELF_STATM_FD)
+except OSError:  # Not Linux
+    _SELF_STATM_FD = None
+
+
+def _fast_rss(process):
+    """RSS in bytes of a psutil.Process."""
+    if _SELF_STATM_FD is None:
+        return process.memory_info().rss
+    if process.pid == os.getpid():
+        statm = os.pread(_SELF_STATM_FD, 64, 0)
+    else:
+        with open(f'/proc/{process.pid}/statm', 'rb') as f:
+            statm = f.read(64)
+    return int(statm.split()[1]) * _PAGE_SIZE
+
+
+class PeakMemorySampler:
+    """
+    Tracks peak RSS (MB) of this process plus its children on a background thread.
+
+    LLMHandler keeps the model resident after the first query, either in this
+    process (llama-cpp-python) or in a llama-server child, and otherwise runs a
+    llama-cli child per query. Children are included so every backend counts;
+    enter the sampler before the model is first loaded.
+    """
+
+    def __init__(self, interval=MEMORY_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.process = psutil.Process()
+        self.initial_mb = 0.0
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample_mb(self):
+        """Current RSS of this process and all its descendants, in MB."""
+        rss = _fast_rss(self.process)
+        for child in self.process.children(recursive=True):
+            try:
+                rss += _fast_rss(child)
+            except (psutil.Error, OSError):
+                pass  # Child exited between listing and sampling
+        return rss / (1024 * 1024)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, self._sample_mb())
+
+    def __enter__(self):
+        self.initial_mb = self.peak_mb = self._sample_mb()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, self._sample_mb())
+
+
 def get_available_models(base_dir):
     """Find all available quantized models."""
     models_dir = base_dir / 'models' / 'quantized'
@@ -43,12 +119,14 @@ def get_available_models(base_dir):
 
     models = {}
     for model_file in models_dir.glob('*.gguf'):
-        name = model_file.name
         # Categorize by quantization level
-        if 'q4' in name.lower():
-            models.setdefault('Q4', []).append(model_file)
-        elif 'q5' in name.lower():
-            models.setdefault('Q5', []).append(model_file)
+        match = _QUANT_LEVEL_RE.search(model_file.name)
+        if match:
+            models.setdefault(f'Q{match.group(1)}', []).append(model_file)
+
+    # Glob order is arbitrary; sort by size so [0] is picked deterministically
+    for model_list in models.values():
+        model_list.sort(key=lambda path: path.stat().st_size)
 
     return models
 
@@ -71,6 +149,15 @@ def benchmark_model(model_path, queries, threads=2):
         print(f"✗ Failed to load model: {e}")
         return None
 
+    # Unload the model before the next one is benchmarked
+    try:
+        return _run_benchmark(handler, model_path, queries)
+    finally:
+        handler.close()
+
+
+def _run_benchmark(handler, model_path, queries):
+    """Run the warmup and timed queries for benchmark_model()."""
     # Track metrics
     results = {
         'model': model_path.name,
@@ -82,51 +169,54 @@ def benchmark_model(model_path, queries, threads=2):
         'failures': 0,
     }
 
-    # Get initial memory
-    process = psutil.Process()
-    initial_memory = process.memory_info().rss / (1024 * 1024)  # MB
-
-    # Run queries
-    for i, query in enumerate(queries, 1):
-        print(f"\n[{i}/{len(queries)}] Query: {query[:60]}...")
-
-        start_time = time.time()
-        result = handler.process_query(query)
-        elapsed = time.time() - start_time
-
-        if result and result['success']:
-            tokens = result.get('tokens_generated', 0)
-            tokens_per_sec = tokens / elapsed if elapsed > 0 else 0
-
-            print(f"  ✓ Success: {tokens} tokens in {elapsed:.2f}s ({tokens_per_sec:.2f} tok/s)")
-            print(f"  Answer: {result['result'][:80]}...")
-
-            results['successes'] += 1
-            results['total_time'] += elapsed
-            results['total_tokens'] += tokens
-
-            results['queries'].append({
-                'query': query,
-                'success': True,
-                'time': elapsed,
-                'tokens': tokens,
-                'tokens_per_sec': tokens_per_sec,
-                'answer': result['result'],
-            })
-        else:
-            error = result.get('error', 'Unknown error') if result else 'No result'
-            print(f"  ✗ Failed: {error}")
-
-            results['failures'] += 1
-            results['queries'].append({
-                'query': query,
-                'success': False,
-                'error': error,
-            })
-
-    # Get peak memory usage
-    peak_memory = process.memory_info().rss / (1024 * 1024)  # MB
-    results['memory_used_mb'] = peak_memory - initial_memory
+    # Sample memory from before the warmup loads the model, so the resident
+    # model counts whether it lives in this process or in llama-server
+    with PeakMemorySampler() as memory:
+        # Warmup: the first run pays for loading the model, which would
+        # otherwise be counted against the first query's tokens/sec
+        print("\nWarming up (not timed)...")
+        handler.process_query(queries[0])
+
+        # Run queries
+        for i, query in enumerate(queries, 1):
+            print(f"\n[{i}/{len(queries)}] Query: {query[:60]}...")
+
+            start_time = time.perf_counter()
+            result = handler.process_query(query)
+            elapsed = time.perf_counter() - start_time
+
+            if result and result['success']:
+                tokens = result.get('tokens_generated', 0)
+                tokens_per_sec = tokens / elapsed if elapsed > 0 else 0
+
+                print(f"  ✓ Success: {tokens} tokens in {elapsed:.2f}s ({tokens_per_sec:.2f} tok/s)")
+                print(f"  Answer: {result['result'][:80]}...")
+
+                results['successes'] += 1
+                results['total_time'] += elapsed
+                results['total_tokens'] += tokens
+
+                results['queries'].append({
+                    'query': query,
+                    'success': True,
+                    'time': elapsed,
+                    'tokens': tokens,
+                    'tokens_per_sec': tokens_per_sec,
+                    'answer': result['result'],
+                })
+            else:
+                error = result.get('error', 'Unknown error') if result else 'No result'
+                print(f"  ✗ Failed: {error}")
+
+                results['failures'] += 1
+                results['queries'].append({
+                    'query': query,
+                    'success': False,
+                    'error': error,
+                })
+
+    # Peak memory over the run, including the model and any llama.cpp children
+    results['memory_used_mb'] = memory.peak_mb - memory.initial_mb
 
     # Calculate averages
     if results['successes'] > 0:
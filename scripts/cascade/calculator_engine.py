@@ -11,19 +11,17 @@ Automatically routes queries to the most appropriate layer and
 cascades to fallback layers if needed.
 """
 
+import re
 import time
 import logging
-from pathlib import Path
-from typing import Optional, Dict, Any, List
-import sys
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Optional, Dict, Any, List, Mapping
 
-# Import handlers
-sys.path.insert(0, str(Path(__file__).parent))
-from sympy_handler import SymPyHandler
-from wolfram_handler import WolframAlphaHandler
-from llm_handler import LLMHandler
-from query_cache import SmartCache
-from query_translator import QueryTranslator
+try:
+    import ahocorasick
+except ImportError:  # optional: pip install pyahocorasick
+    ahocorasick = None
 
 
 class MathQueryRouter:
@@ -53,72 +51,165 @@ class MathQueryRouter:
         'strategy', 'approach', 'understand', 'reasoning'
     ]
 
+    # Keywords that send a query straight to the LLM
+    PROOF_KEYWORDS = ['prove', 'proof', 'explain', 'why', 'show that']
+
+    # Word problem indicators
+    WORD_PROBLEM_NAMES = ['alice', 'bob', 'train', 'car', 'store']
+    WORD_PROBLEM_PHRASES = ['if ', 'then', 'how many', 'how much']
+
+    # Score buckets, in KEYWORD_BUCKETS order
+    SYMPY, WOLFRAM, LLM, PROOF, NAME, PHRASE = range(6)
+    KEYWORD_BUCKETS = (SYMPY_KEYWORDS, WOLFRAM_KEYWORDS, LLM_KEYWORDS,
+                       PROOF_KEYWORDS, WORD_PROBLEM_NAMES, WORD_PROBLEM_PHRASES)
+
+    # Fixed routing decisions, shared by every query that takes them
+    _ROUTE_LLM_PROOF = MappingProxyType({
+        'primary': 'llm',
+        'fallback_order': (),
+        'confidence': 0.95,
+        'reasoning': 'Requires explanation or proof'
+    })
+    _ROUTE_LLM_WORD = MappingProxyType({
+        'primary': 'llm',
+        'fallback_order': (),
+        'confidence': 0.9,
+        'reasoning': 'Word problem detected'
+    })
+    _ROUTE_DEFAULT = MappingProxyType({
+        'primary': 'sympy',
+        'fallback_order': ('wolfram', 'llm'),
+        'confidence': 0.6,
+        'reasoning': 'No strong indicators, defaulting to SymPy → cascade'
+    })
+
+    # Opening words that decide the route on their own. Only proof keywords
+    # qualify: they win over every other check, so the result is the same
+    _FIRST_WORD_ROUTES = {
+        'prove': _ROUTE_LLM_PROOF,
+        'proof': _ROUTE_LLM_PROOF,
+        'explain': _ROUTE_LLM_PROOF,
+        'why': _ROUTE_LLM_PROOF,
+    }
+
+    # Aho-Corasick automaton over every keyword (None without pyahocorasick)
+    _automaton = None
+
     def __init__(self):
         """Initialize the router."""
         self.logger = logging.getLogger(__name__)
+        # Per-instance memo, released along with the router
+        self.route_query = lru_cache(maxsize=1024)(self.route_query)
+
+    @classmethod
+    def _build_automaton(cls):
+        """Build one automaton mapping each keyword to the buckets it scores in."""
+        buckets = {}
+        for bucket, keywords in enumerate(cls.KEYWORD_BUCKETS):
+            for kw in keywords:
+                buckets.setdefault(kw, []).append(bucket)
+
+        automaton = ahocorasick.Automaton()
+        for kw, ids in buckets.items():
+            automaton.add_word(kw, (kw, tuple(ids)))
+        automaton.make_automaton()
+        return automaton
+
+    def _keyword_scores(self, query_lower: str) -> List[int]:
+        """Count the distinct keywords of each bucket found in the query."""
+        if self._automaton is None:
+            scores = [sum(1 for kw in keywords if kw in query_lower)
+                      for keywords in self.KEYWORD_BUCKETS[:self.PROOF]]
+            scores += [0, 0, 0]
+            hits = {(m.lastindex, m.group(m.lastindex))
+                    for m in _INDICATOR_RE.finditer(query_lower)}
+            for group, _ in hits:
+                scores[self.PROOF + group - 1] += 1
+            return scores
+
+        # One pass over the query; a keyword seen twice still counts once
+        scores = [0] * len(self.KEYWORD_BUCKETS)
+        for _, ids in {value for _, value in self._automaton.iter(query_lower)}:
+            for bucket in ids:
+                scores[bucket] += 1
+        return scores
+
+    def route_query(self, query: str) -> Mapping[str, Any]:
+        """
+        Route a query to the most appropriate computational layer.
 
-    def route_query(self, query: str) -> Dict[str, Any]:
-        """Route a query to the most appropriate computational layer."""
+        Routing is deterministic, so decisions are memoized per query; the
+        returned mapping is shared between calls and therefore read-only.
+        """
         query_lower = query.lower()
 
+        # A query that opens with a proof keyword needs no scoring
+        first_word = query_lower.split(None, 1)
+        if first_word:
+            route = self._FIRST_WORD_ROUTES.get(first_word[0])
+            if route is not None:
+                return route
+
+        scores = self._keyword_scores(query_lower)
+
         # Proofs and explanations go to LLM
-        if any(kw in query_lower for kw in ['prove', 'proof', 'explain', 'why', 'show that']):
-            return {
-                'primary': 'llm',
-                'fallback_order': [],
-                'confidence': 0.95,
-                'reasoning': 'Requires explanation or proof'
-            }
+        if scores[self.PROOF]:
+            return self._ROUTE_LLM_PROOF
 
         # Word problems go to LLM
-        if self._is_word_problem(query):
-            return {
-                'primary': 'llm',
-                'fallback_order': [],
-                'confidence': 0.9,
-                'reasoning': 'Word problem detected'
-            }
+        if self._is_word_problem(query, scores):
+            return self._ROUTE_LLM_WORD
 
         # Check keyword matches
-        sympy_score = sum(1 for kw in self.SYMPY_KEYWORDS if kw in query_lower)
-        wolfram_score = sum(1 for kw in self.WOLFRAM_KEYWORDS if kw in query_lower)
-        llm_score = sum(1 for kw in self.LLM_KEYWORDS if kw in query_lower)
+        sympy_score = scores[self.SYMPY]
+        wolfram_score = scores[self.WOLFRAM]
+        llm_score = scores[self.LLM]
 
         # Route based on highest score
         if sympy_score > max(wolfram_score, llm_score):
-            return {
+            return MappingProxyType({
                 'primary': 'sympy',
-                'fallback_order': ['wolfram', 'llm'],
+                'fallback_order': ('wolfram', 'llm'),
                 'confidence': 0.8,
                 'reasoning': f'SymPy keywords detected (score: {sympy_score})'
-            }
+            })
         elif wolfram_score > llm_score:
-            return {
+            return MappingProxyType({
                 'primary': 'wolfram',
-                'fallback_order': ['llm'],
+                'fallback_order': ('llm',),
                 'confidence': 0.75,
                 'reasoning': f'Wolfram keywords detected (score: {wolfram_score})'
-            }
+            })
         else:
             # Default: try SymPy first (fastest), then cascade
-            return {
-                'primary': 'sympy',
-                'fallback_order': ['wolfram', 'llm'],
-                'confidence': 0.6,
-                'reasoning': 'No strong indicators, defaulting to SymPy → cascade'
-            }
+            return self._ROUTE_DEFAULT
 
-    def _is_word_problem(self, query: str) -> bool:
+    def _is_word_problem(self, query: str, scores: Optional[List[int]] = None) -> bool:
         """Detect if query is a word problem."""
+        if scores is None:
+            scores = self._keyword_scores(query.lower())
+
         indicators = [
             len(query.split()) > 15,  # Long queries often word problems
-            any(name in query.lower() for name in ['alice', 'bob', 'train', 'car', 'store']),
+            scores[self.NAME] > 0,
             '?' in query and not any(op in query for op in ['=', 'd/dx', '∫']),
-            any(word in query.lower() for word in ['if ', 'then', 'how many', 'how much'])
+            scores[self.PHRASE] > 0
         ]
         return sum(indicators) >= 2
 
 
+# Proof and word-problem indicators in one scan; the lookahead keeps
+# overlapping hits, matching the per-keyword substring checks
+_INDICATOR_RE = re.compile('(?=(?:{}))'.format('|'.join(
+    '(?P<{}>{})'.format(name, '|'.join(map(re.escape, keywords)))
+    for name, keywords in (('proof', MathQueryRouter.PROOF_KEYWORDS),
+                           ('name', MathQueryRouter.WORD_PROBLEM_NAMES),
+                           ('phrase', MathQueryRouter.WORD_PROBLEM_PHRASES)))))
+
+if ahocorasick is not None:
+    MathQueryRouter._automaton = MathQueryRouter._build_automaton()
+
+
 class CalculatorEngine:
     """
     Main orchestrator for the Holy Calculator cascade system.
@@ -126,6 +217,18 @@ class CalculatorEngine:
     Manages all three layers and handles cascading logic.
     """
 
+    LAYER_NAMES = {
+        'sympy': 'Layer 1 (SymPy)',
+        'wolfram': 'Layer 2 (Wolfram Alpha)',
+        'llm': 'Layer 3 (LLM)',
+    }
+
+    LAYER_STAT_KEYS = {
+        'sympy': 'sympy_successes',
+        'wolfram': 'wolfram_successes',
+        'llm': 'llm_successes',
+    }
+
     def __init__(self, enable_wolfram: bool = False, wolfram_dev_mode: bool = True,
                  model_path: Optional[str] = None, enable_cache: bool = True):
         """
@@ -139,6 +242,13 @@ class CalculatorEngine:
         """
         self.logger = logging.getLogger(__name__)
 
+        # Imported here so that importing this module (e.g. only for
+        # MathQueryRouter) does not load SymPy, requests and the handlers
+        from .sympy_handler import SymPyHandler
+        from .llm_handler import LLMHandler
+        from .query_cache import SmartCache
+        from .query_translator import QueryTranslator
+
         # Initialize query translator
         self.translator = QueryTranslator()
         self.logger.info("✓ Query translator initialized")
@@ -168,6 +278,7 @@ class CalculatorEngine:
 
         if enable_wolfram:
             try:
+                from .wolfram_handler import WolframAlphaHandler
                 self.wolfram = WolframAlphaHandler()
                 self.logger.info("✓ Layer 2 (Wolfram Alpha) initialized")
             except Exception as e:
@@ -185,6 +296,18 @@ class CalculatorEngine:
         # Router
         self.router = MathQueryRouter()
 
+        # Layer dispatch for solve()
+        self._layer_fns = {
+            'sympy': self._try_sympy,
+            'wolfram': self._try_wolfram,
+            'llm': self._try_llm,
+        }
+        self._layer_enabled = {
+            'sympy': True,
+            'wolfram': self.wolfram_enabled,
+            'llm': True,
+        }
+
         # Statistics
         self.stats = {
             'total_queries': 0,
@@ -195,6 +318,7 @@ class CalculatorEngine:
             'avg_response_time': 0,
             'cascade_triggered': 0,  # How many times we fell through to next layer
         }
+        self._total_response_ns = 0
 
     def solve(self, query: str, force_layer: Optional[str] = None) -> Dict[str, Any]:
         """
@@ -215,17 +339,19 @@ class CalculatorEngine:
                 'error': str or None
             }
         """
+        start_ns = time.perf_counter_ns()
+
         # Check cache first (skip if force_layer specified)
+        cache_token = None
         if self.cache_enabled and not force_layer:
-            cached_result = self.cache.get(query)
-            if cached_result is not None:
-                self.logger.info(f"✓ Cache HIT: {query[:50]}")
-                # Update response time to reflect cache retrieval
-                cached_result['response_time'] = 0.001  # Near-instant
-                cached_result['from_cache'] = True
-                return cached_result
-
-        start_time = time.time()
+            hit, cached_result, cache_token = self.cache.get_or_reserve(query)
+            if hit:
+                self.logger.info("✓ Cache HIT: %.50s", query)
+                # Copy so the cached entry itself is never modified
+                return {**cached_result,
+                        'response_time': (time.perf_counter_ns() - start_ns) / 1e9,
+                        'from_cache': True}
+
         self.stats['total_queries'] += 1
 
         # Route the query
@@ -235,61 +361,50 @@ class CalculatorEngine:
         else:
             routing = self.router.route_query(query)
 
-        self.logger.info(f"Query: {query[:60]}...")
-        self.logger.debug(f"Routing: {routing['primary']} (confidence: {routing['confidence']:.2f})")
-        self.logger.debug(f"Reasoning: {routing['reasoning']}")
+        self.logger.info("Query: %.60s...", query)
+        self.logger.debug("Routing: %s (confidence: %.2f)", routing['primary'], routing['confidence'])
+        self.logger.debug("Reasoning: %s", routing['reasoning'])
 
         # Build execution order
-        execution_order = [routing['primary']] + routing['fallback_order']
+        execution_order = [routing['primary'], *routing['fallback_order']]
         cascade_path = []
 
+        # Translate once for every layer that needs it
+        try:
+            translated = self.translator.translate(query)
+        except Exception as e:
+            self.logger.debug("Translation error: %s", e)
+            translated = None
+
         # Try each layer in order
-        for layer in execution_order:
+        last_idx = len(execution_order) - 1
+        for idx, layer in enumerate(execution_order):
             cascade_path.append(layer)
 
-            result = None
-
-            # Try SymPy
-            if layer == 'sympy':
-                self.logger.debug("→ Trying Layer 1 (SymPy)...")
-                result = self._try_sympy(query)
-
-            # Try Wolfram
-            elif layer == 'wolfram':
-                if not self.wolfram_enabled:
-                    self.logger.debug("→ Wolfram Alpha disabled, skipping...")
-                    continue
-
-                self.logger.debug("→ Trying Layer 2 (Wolfram Alpha)...")
-                result = self._try_wolfram(query)
+            if not self._layer_enabled.get(layer, True):
+                self.logger.debug("→ %s disabled, skipping...", self.LAYER_NAMES[layer])
+                continue
 
-            # Try LLM
-            elif layer == 'llm':
-                self.logger.debug("→ Trying Layer 3 (LLM)...")
-                result = self._try_llm(query)
+            try_layer = self._layer_fns.get(layer)
+            result = None
+            if try_layer is not None:
+                self.logger.debug("→ Trying %s...", self.LAYER_NAMES[layer])
+                result = try_layer(query, translated)
 
             # Check if successful
             if result and result['success']:
-                response_time = time.time() - start_time
+                elapsed_ns = time.perf_counter_ns() - start_ns
+                response_time = elapsed_ns / 1e9
 
                 # Update statistics
-                if layer == 'sympy':
-                    self.stats['sympy_successes'] += 1
-                elif layer == 'wolfram':
-                    self.stats['wolfram_successes'] += 1
-                elif layer == 'llm':
-                    self.stats['llm_successes'] += 1
+                self.stats[self.LAYER_STAT_KEYS[layer]] += 1
 
                 if len(cascade_path) > 1:
                     self.stats['cascade_triggered'] += 1
 
-                # Update average response time
-                n = self.stats['total_queries']
-                self.stats['avg_response_time'] = (
-                    (self.stats['avg_response_time'] * (n - 1) + response_time) / n
-                )
+                self._update_avg_response_time(elapsed_ns)
 
-                self.logger.info(f"✓ Solved by {layer} in {response_time:.2f}s")
+                self.logger.info("✓ Solved by %s in %.2fs", layer, response_time)
 
                 final_result = {
                     'success': True,
@@ -303,21 +418,25 @@ class CalculatorEngine:
                 }
 
                 # Cache successful results
-                if self.cache_enabled:
+                if cache_token is not None:
+                    self.cache.commit(cache_token, final_result)
+                elif self.cache_enabled:
                     self.cache.set(query, final_result)
-                    self.logger.debug(f"Cached result for: {query[:50]}")
+                    self.logger.debug("Cached result for: %.50s", query)
 
                 return final_result
 
             # Layer failed, cascade to next
-            if len(execution_order) > 1 and layer != execution_order[-1]:
-                self.logger.debug(f"  ✗ {layer} failed, cascading to next layer...")
+            if idx < last_idx:
+                self.logger.debug("  ✗ %s failed, cascading to next layer...", layer)
 
         # All layers failed
-        response_time = time.time() - start_time
+        elapsed_ns = time.perf_counter_ns() - start_ns
+        response_time = elapsed_ns / 1e9
         self.stats['total_failures'] += 1
+        self._update_avg_response_time(elapsed_ns)
 
-        self.logger.warning(f"✗ All layers failed for query: {query[:60]}...")
+        self.logger.warning("✗ All layers failed for query: %.60s...", query)
 
         return {
             'success': False,
@@ -329,12 +448,21 @@ class CalculatorEngine:
             'error': 'All layers failed to solve the query'
         }
 
-    def _try_sympy(self, query: str) -> Optional[Dict[str, Any]]:
+    def _update_avg_response_time(self, elapsed_ns: int):
+        """Fold one query into the average, summing exact integer nanoseconds."""
+        self._total_response_ns += elapsed_ns
+        self.stats['avg_response_time'] = (
+            self._total_response_ns / self.stats['total_queries'] / 1e9
+        )
+
+    def _try_sympy(self, query: str,
+                   translated: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
         """Try solving with SymPy using translated format."""
         try:
             # Translate query to SymPy-compatible format
-            translated = self.translator.translate(query)
-            self.logger.debug(f"Translated to SymPy format: {translated['sympy_format']}")
+            if translated is None:
+                translated = self.translator.translate(query)
+            self.logger.debug("Translated to SymPy format: %s", translated['sympy_format'])
 
             # Use translated format for known operations, original for general
             if translated['operation'] in ['derivative', 'second_derivative', 'third_derivative',
@@ -346,30 +474,33 @@ class CalculatorEngine:
 
             return self.sympy.process_query(query_to_process)
         except Exception as e:
-            self.logger.debug(f"SymPy error: {e}")
+            self.logger.debug("SymPy error: %s", e)
             return None
 
-    def _try_wolfram(self, query: str) -> Optional[Dict[str, Any]]:
+    def _try_wolfram(self, query: str,
+                     translated: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
         """Try solving with Wolfram Alpha."""
         try:
             return self.wolfram.process_query(query, is_dev=self.wolfram_dev_mode)
         except Exception as e:
-            self.logger.debug(f"Wolfram error: {e}")
+            self.logger.debug("Wolfram error: %s", e)
             return None
 
-    def _try_llm(self, query: str) -> Optional[Dict[str, Any]]:
+    def _try_llm(self, query: str,
+                 translated: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
         """Try solving with LLM using optimized prompt format."""
         try:
             # Translate query to LLM-optimized format
-            translated = self.translator.translate(query)
-            self.logger.debug(f"Using LLM-optimized prompt format")
+            if translated is None:
+                translated = self.translator.translate(query)
+            self.logger.debug("Using LLM-optimized prompt format")
 
             # Use LLM-formatted prompt which encourages proper answer formatting
             query_to_process = translated['llm_format']
 
             return self.llm.process_query(query_to_process)
         except Exception as e:
-            self.logger.debug(f"LLM error: {e}")
+            self.logger.debug("LLM error: %s", e)
             return None
 
     def get_stats(self) -> Dict[str, Any]:
@@ -404,57 +535,65 @@ class CalculatorEngine:
         if self.stats['total_queries'] == 0:
             return 0.0
 
-        successes = self.stats.get(f'{layer}_successes', 0)
+        successes = self.stats.get(self.LAYER_STAT_KEYS.get(layer), 0)
         return (successes / self.stats['total_queries']) * 100
 
     def print_stats(self):
         """Print formatted statistics."""
-        print("\n" + "=" * 70)
-        print("HOLY CALCULATOR - CASCADE STATISTICS")
-        print("=" * 70)
-
-        # Engine stats
-        print("\n📊 ENGINE STATISTICS:")
-        print(f"   Total queries: {self.stats['total_queries']}")
-        print(f"   Successful: {self.stats['total_queries'] - self.stats['total_failures']}")
-        print(f"   Failed: {self.stats['total_failures']}")
-        print(f"   Avg response time: {self.stats['avg_response_time']:.2f}s")
-        print(f"   Cascade triggered: {self.stats['cascade_triggered']} times")
-
-        # Layer breakdown
-        print("\n🎯 LAYER PERFORMANCE:")
-        print(f"   Layer 1 (SymPy):   {self.stats['sympy_successes']:3d} successes "
-              f"({self._calc_success_rate('sympy'):5.1f}%)")
+        stats = self.stats
+        lines = [
+            "\n" + "=" * 70,
+            "HOLY CALCULATOR - CASCADE STATISTICS",
+            "=" * 70,
+
+            # Engine stats
+            "\n📊 ENGINE STATISTICS:",
+            f"   Total queries: {stats['total_queries']}",
+            f"   Successful: {stats['total_queries'] - stats['total_failures']}",
+            f"   Failed: {stats['total_failures']}",
+            f"   Avg response time: {stats['avg_response_time']:.2f}s",
+            f"   Cascade triggered: {stats['cascade_triggered']} times",
+
+            # Layer breakdown
+            "\n🎯 LAYER PERFORMANCE:",
+            f"   Layer 1 (SymPy):   {stats['sympy_successes']:3d} successes "
+            f"({self._calc_success_rate('sympy'):5.1f}%)",
+        ]
 
         if self.wolfram_enabled:
-            print(f"   Layer 2 (Wolfram): {self.stats['wolfram_successes']:3d} successes "
-                  f"({self._calc_success_rate('wolfram'):5.1f}%)")
+            lines.append(f"   Layer 2 (Wolfram): {stats['wolfram_successes']:3d} successes "
+                         f"({self._calc_success_rate('wolfram'):5.1f}%)")
         else:
-            print(f"   Layer 2 (Wolfram): DISABLED")
+            lines.append("   Layer 2 (Wolfram): DISABLED")
 
-        print(f"   Layer 3 (LLM):     {self.stats['llm_successes']:3d} successes "
-              f"({self._calc_success_rate('llm'):5.1f}%)")
+        lines.append(f"   Layer 3 (LLM):     {stats['llm_successes']:3d} successes "
+                     f"({self._calc_success_rate('llm'):5.1f}%)")
 
         # Cache statistics
         if self.cache_enabled and self.cache:
-            print("\n💾 CACHE STATISTICS:")
             cache_stats = self.cache.get_stats()
-            print(f"   Hits:        {cache_stats['hits']} ({cache_stats['hit_rate']}%)")
-            print(f"   Misses:      {cache_stats['misses']}")
-            print(f"   Memory:      {cache_stats['memory_entries']} entries")
-            print(f"   Disk:        {cache_stats['disk_entries']} entries ({cache_stats['disk_size_mb']} MB)")
+            lines += [
+                "\n💾 CACHE STATISTICS:",
+                f"   Hits:        {cache_stats['hits']} ({cache_stats['hit_rate']}%)",
+                f"   Misses:      {cache_stats['misses']}",
+                f"   Memory:      {cache_stats['memory_entries']} entries",
+                f"   Disk:        {cache_stats['disk_entries']} entries ({cache_stats['disk_size_mb']} MB)",
+            ]
 
         # Overall success rate
-        if self.stats['total_queries'] > 0:
-            overall_rate = ((self.stats['total_queries'] - self.stats['total_failures']) /
-                          self.stats['total_queries'] * 100)
-            print(f"\n   Overall success rate: {overall_rate:.1f}%")
+        if stats['total_queries'] > 0:
+            overall_rate = ((stats['total_queries'] - stats['total_failures']) /
+                            stats['total_queries'] * 100)
+            lines.append(f"\n   Overall success rate: {overall_rate:.1f}%")
+
+        lines.append("=" * 70 + "\n")
 
-        print("=" * 70 + "\n")
+        # One write instead of a print() per line
+        print('\n'.join(lines))
 
 
 def main():
-    """Test the calculator engine."""
+    """Test the calculator engine (python -m scripts.cascade.calculator_engine)."""
     import logging
     logging.basicConfig(level=logging.INFO)
 
@@ -13,9 +13,32 @@ Battery-optimized: Uses rule-based classification first, LLM only for ambiguous
 """
 
 import re
+from collections import OrderedDict
 from typing import Dict, Any, Optional
 from enum import Enum
 
+# Student answer extraction, matched against the lower-cased query
+_STUDENT_ANSWER_RES = tuple(re.compile(p) for p in (
+    r'i (think|believe|got) (?:the answer is |that )?(.+?)(?:\?|$)',
+    r'my answer(?: is)?:?\s*(.+?)(?:\?|$)',
+    r'is (.+?) (?:right|correct|the answer)\??',
+))
+
+# Verification language stripped to recover the original problem
+_VERIFICATION_PHRASE_RES = tuple(re.compile(p, re.IGNORECASE) for p in (
+    r'\bis (this|my answer) (right|correct)\??',
+    r'\bcheck (this|my (answer|work))\b',
+    r'\bdid i (get|do) (this|it) (right|correctly)\??',
+    r'\bi (got|think|believe)',
+    r'\bmy answer(?: is)?:?',
+))
+
+# Common tutoring preambles stripped from tutoring requests
+_TUTORING_PREAMBLE_RES = tuple(re.compile(p, re.IGNORECASE) for p in (
+    r'^(how (do|can|should) i|help me|guide me|show me how to|teach me to)\s+',
+    r'^(can you help( me)? with|i need help with)\s+',
+))
+
 
 class UserIntent(Enum):
     """User's learning intent."""
@@ -81,6 +104,12 @@ class IntentClassifier:
         r'^\s*(solve|find|simplify|factor|expand):?\s',  # Imperative commands
     ]
 
+    # Matches beyond this many no longer raise confidence
+    MAX_SCORE = 3
+
+    # Recent classifications kept for repeated queries
+    CACHE_SIZE = 256
+
     def __init__(self):
         """Initialize the intent classifier."""
         # Compile patterns for efficiency
@@ -89,6 +118,12 @@ class IntentClassifier:
         self.verification_patterns = [re.compile(p, re.IGNORECASE) for p in self.VERIFICATION_PATTERNS]
         self.quick_answer_patterns = [re.compile(p, re.IGNORECASE) for p in self.QUICK_ANSWER_PATTERNS]
 
+        # One alternation per category, so a query that matches nothing in a
+        # category costs one regex scan instead of one per pattern
+        self.tutoring_re = self._compile_any(self.TUTORING_PATTERNS)
+        self.explanation_re = self._compile_any(self.EXPLANATION_PATTERNS)
+        self.quick_answer_re = self._compile_any(self.QUICK_ANSWER_PATTERNS)
+
         # Statistics
         self.stats = {
             'classifications': 0,
@@ -99,6 +134,33 @@ class IntentClassifier:
             'unknown': 0,
         }
 
+        # (query, student_answer) -> classification, least recent first
+        self._cache: OrderedDict = OrderedDict()
+
+    @staticmethod
+    def _compile_any(patterns) -> re.Pattern:
+        """Compile patterns into one case-insensitive regex matching any of them."""
+        return re.compile('|'.join(f'(?:{p})' for p in patterns), re.IGNORECASE)
+
+    @classmethod
+    def _score(cls, combined: re.Pattern, patterns, text: str) -> int:
+        """
+        Count matching patterns, up to MAX_SCORE.
+
+        One combined scan rules out a miss; counting stops at the cap since
+        confidence (0.7 + 0.1 per match) already reaches its 0.95 ceiling.
+        """
+        if combined.search(text) is None:
+            return 0
+
+        score = 0
+        for p in patterns:
+            if p.search(text):
+                score += 1
+                if score >= cls.MAX_SCORE:
+                    break
+        return score
+
     def classify(self, query: str, student_answer: Optional[str] = None) -> Dict[str, Any]:
         """
         Classify user intent from query.
@@ -120,12 +182,27 @@ class IntentClassifier:
         """
         self.stats['classifications'] += 1
 
-        query_lower = query.lower().strip()
+        key = (query, student_answer)
+        result = self._cache.get(key)
+        if result is None:
+            result = self._classify(query, student_answer)
+            self._cache[key] = result
+            if len(self._cache) > self.CACHE_SIZE:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(key)
+
+        self.stats[result['intent'].value] += 1
+        return dict(result)  # callers may modify their copy
+
+    def _classify(self, query: str, student_answer: Optional[str]) -> Dict[str, Any]:
+        """Rule-based classification behind classify()'s cache."""
+        lowered = query.lower()
+        query_lower = lowered.strip()
 
         # If student provided their answer, likely verification
-        if student_answer or self._extract_student_answer(query):
-            extracted_answer = student_answer or self._extract_student_answer(query)
-            self.stats['verification'] += 1
+        extracted_answer = student_answer or self._extract_student_answer(query, lowered)
+        if extracted_answer:
             return {
                 'intent': UserIntent.VERIFICATION,
                 'confidence': 0.95,
@@ -136,9 +213,8 @@ class IntentClassifier:
             }
 
         # Check for explicit tutoring requests
-        tutoring_score = sum(1 for p in self.tutoring_patterns if p.search(query_lower))
+        tutoring_score = self._score(self.tutoring_re, self.tutoring_patterns, query_lower)
         if tutoring_score > 0:
-            self.stats['tutoring'] += 1
             return {
                 'intent': UserIntent.TUTORING,
                 'confidence': min(0.7 + (tutoring_score * 0.1), 0.95),
@@ -149,9 +225,8 @@ class IntentClassifier:
             }
 
         # Check for explanation requests
-        explanation_score = sum(1 for p in self.explanation_patterns if p.search(query_lower))
+        explanation_score = self._score(self.explanation_re, self.explanation_patterns, query_lower)
         if explanation_score > 0:
-            self.stats['explanation'] += 1
             return {
                 'intent': UserIntent.EXPLANATION,
                 'confidence': min(0.7 + (explanation_score * 0.1), 0.95),
@@ -162,9 +237,7 @@ class IntentClassifier:
             }
 
         # Check for quick answer patterns
-        quick_score = sum(1 for p in self.quick_answer_patterns if p.search(query_lower))
-        if quick_score > 0:
-            self.stats['quick_answer'] += 1
+        if self.quick_answer_re.search(query_lower):
             return {
                 'intent': UserIntent.QUICK_ANSWER,
                 'confidence': 0.85,
@@ -176,7 +249,6 @@ class IntentClassifier:
 
         # Default: Assume tutoring mode for educational context
         # Better to teach when uncertain than to just give answers
-        self.stats['tutoring'] += 1
         return {
             'intent': UserIntent.TUTORING,
             'confidence': 0.60,
@@ -186,7 +258,8 @@ class IntentClassifier:
             'student_answer': None
         }
 
-    def _extract_student_answer(self, query: str) -> Optional[str]:
+    def _extract_student_answer(self, query: str,
+                                query_lower: Optional[str] = None) -> Optional[str]:
         """
         Extract student's proposed answer from verification queries.
 
@@ -195,14 +268,11 @@ class IntentClassifier:
         - "I think the answer is 42" → "42"
         - "My answer: 3.14159" → "3.14159"
         """
-        patterns = [
-            r'i (think|believe|got) (?:the answer is |that )?(.+?)(?:\?|$)',
-            r'my answer(?: is)?:?\s*(.+?)(?:\?|$)',
-            r'is (.+?) (?:right|correct|the answer)\??',
-        ]
-
-        for pattern in patterns:
-            match = re.search(pattern, query.lower())
+        if query_lower is None:
+            query_lower = query.lower()
+
+        for pattern in _STUDENT_ANSWER_RES:
+            match = pattern.search(query_lower)
             if match:
                 # Extract the answer (last captured group)
                 answer = match.group(match.lastindex).strip()
@@ -213,17 +283,9 @@ class IntentClassifier:
     def _extract_problem_from_verification(self, query: str) -> str:
         """Extract the original problem from a verification query."""
         # Remove verification language to get problem
-        verification_phrases = [
-            r'\bis (this|my answer) (right|correct)\??',
-            r'\bcheck (this|my (answer|work))\b',
-            r'\bdid i (get|do) (this|it) (right|correctly)\??',
-            r'\bi (got|think|believe)',
-            r'\bmy answer(?: is)?:?',
-        ]
-
         cleaned = query
-        for phrase in verification_phrases:
-            cleaned = re.sub(phrase, '', cleaned, flags=re.IGNORECASE)
+        for phrase in _VERIFICATION_PHRASE_RES:
+            cleaned = phrase.sub('', cleaned)
 
         return cleaned.strip()
 
@@ -236,14 +298,9 @@ class IntentClassifier:
         - "Help me find the derivative of x^2" → "derivative of x^2"
         """
         # Remove common tutoring preambles
-        tutoring_preambles = [
-            r'^(how (do|can|should) i|help me|guide me|show me how to|teach me to)\s+',
-            r'^(can you help( me)? with|i need help with)\s+',
-        ]
-
         cleaned = query
-        for preamble in tutoring_preambles:
-            cleaned = re.sub(preamble, '', cleaned, flags=re.IGNORECASE)
+        for preamble in _TUTORING_PREAMBLE_RES:
+            cleaned = preamble.sub('', cleaned)
 
         return cleaned.strip()
 
@@ -6,17 +6,46 @@ Handles complex reasoning, word problems, and explanations that
 require deep mathematical understanding.
 """
 
+import atexit
+import json
 import subprocess
 import os
 import re
+import socket
 import sys
+import threading
+import time
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterable, Tuple
+
+import requests
 
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 from platform_config import PlatformConfig
 
+try:
+    from llama_cpp import Llama
+except ImportError:  # optional: pip install llama-cpp-python
+    Llama = None
+
+try:
+    import re2
+except ImportError:  # optional: pip install google-re2
+    re2 = None
+
+# llama.cpp timeouts (Raspberry Pi needs more time)
+LLM_TIMEOUT = 300           # seconds per completion
+SERVER_START_TIMEOUT = 300  # seconds for llama-server to load the model
+
+
+def _compile_answer_pattern(pattern: str):
+    """Compile a case-insensitive, multi-line answer pattern, with RE2 if installed."""
+    if re2 is not None:
+        # RE2 takes flags inline; it scans long LLM output in linear time
+        return re2.compile(f'(?im){pattern}')
+    return re.compile(pattern, re.IGNORECASE | re.MULTILINE)
+
 
 class LLMHandler:
     """
@@ -25,6 +54,62 @@ class LLMHandler:
     Specializes in reasoning, proofs, word problems, and multi-step solutions.
     """
 
+    # Chain-of-Thought scaffolding optimized for Qwen2.5-Math. Identical for
+    # every query, so it is kept ahead of the problem as a cacheable prefix.
+    PROMPT_PREAMBLE = """You are a mathematical expert. Solve the problem below using clear step-by-step reasoning.
+
+Solve the problem systematically:
+
+Step 1 - Understand the Problem:
+- What is being asked?
+- What information is given?
+- What mathematical concepts apply?
+
+Step 2 - Plan the Solution:
+- What formulas or theorems are needed?
+- What is the logical sequence of steps?
+
+Step 3 - Execute the Solution:
+[Show all calculations clearly]
+
+Step 4 - Verify the Answer:
+- Does the result make sense?
+- Can I check it a different way?
+
+IMPORTANT: End your response with "The answer is:" followed by ONLY the final numerical or algebraic answer.
+
+"""
+
+    # Answer patterns for _extract_answer, in order of preference
+    _ANSWER_PATTERNS = tuple(_compile_answer_pattern(pattern) for pattern in (
+        # LaTeX boxed format (highest priority for math LLMs)
+        r"\\boxed\{([^}]+)\}",
+
+        # GSM8K format
+        r"####\s*([^\n]+)",
+
+        # Explicit answer markers (multi-line aware)
+        r"(?:The answer is|Answer:|Final answer:)\s*[:]*\s*\$?\\?\[?\s*([^\\$\n]+)",
+
+        # Common conclusion phrases
+        r"Therefore,?\s+([^\n.]+)[.\n]",
+        r"Thus,?\s+([^\n.]+)[.\n]",
+        r"So,?\s+([^\n.]+)[.\n]",
+
+        # Solution markers
+        r"Solution:\s*([^\n]+)",
+        r"Result:\s*([^\n]+)",
+
+        # Equation format (equals sign)
+        r"=\s*([0-9.x\-+*/^()]+)\s*(?:\n|$)",
+
+        # Last resort: look for conclusion after steps
+        r"Step \d+.*?\n\s*([^\n]+)$",
+    ))
+
+    # First answer pattern; once it matches, streaming can stop early
+    _BOXED_RE = _ANSWER_PATTERNS[0]
+
     def __init__(self, model_path: Optional[str] = None, llama_cpp_path: Optional[str] = None):
         """Initialize the LLM handler with model and binary paths."""
         # Detect platform and get optimized configuration
@@ -46,6 +131,20 @@ class LLMHandler:
         if not self.llama_cli.exists():
             raise FileNotFoundError(f"llama-cli binary not found: {llama_cpp_path}")
 
+        # Keep the model resident between queries, loaded on first use: in
+        # process via llama-cpp-python if installed, else in the llama-server
+        # built alongside llama-cli. LLM_USE_CLI=1 forces a fresh llama-cli
+        # process per query.
+        use_cli = bool(os.environ.get('LLM_USE_CLI'))
+        self.use_bindings = Llama is not None and not use_cli
+        self._llama = None
+        llama_server = self.llama_cli.with_name('llama-server')
+        use_server = llama_server.exists() and not use_cli
+        self.llama_server = llama_server if use_server else None
+        self._server = None
+        self._server_url = None
+        self._session = None
+
         # Platform-optimized inference parameters
         platform_params = self.platform_config.get_llm_params()
         self.default_params = {
@@ -122,6 +221,9 @@ class LLMHandler:
 
         Uses structured reasoning to improve accuracy and show work.
         Qwen2.5-Math responds well to explicit step-by-step instructions.
+        The fixed PROMPT_PREAMBLE comes first and the query last, so the
+        resident model reuses the preamble's KV cache between queries and
+        only prefills the query-specific tail.
 
         Args:
             query: User's mathematical query
@@ -129,34 +231,7 @@ class LLMHandler:
         Returns:
             Formatted Chain-of-Thought prompt string
         """
-        # Chain-of-Thought prompt format optimized for Qwen2.5-Math
-        prompt = f"""You are a mathematical expert. Solve this problem using clear step-by-step reasoning.
-
-Problem: {query}
-
-Solve this problem systematically:
-
-Step 1 - Understand the Problem:
-- What is being asked?
-- What information is given?
-- What mathematical concepts apply?
-
-Step 2 - Plan the Solution:
-- What formulas or theorems are needed?
-- What is the logical sequence of steps?
-
-Step 3 - Execute the Solution:
-[Show all calculations clearly]
-
-Step 4 - Verify the Answer:
-- Does the result make sense?
-- Can I check it a different way?
-
-IMPORTANT: End your response with "The answer is:" followed by ONLY the final numerical or algebraic answer.
-
-Solution:"""
-
-        return prompt
+        return f"{self.PROMPT_PREAMBLE}Problem: {query}\n\nSolution:"
 
     def process_query(self, query: str, **kwargs) -> Optional[Dict[str, Any]]:
         """
@@ -177,58 +252,24 @@ Solution:"""
         # Merge custom params with defaults
         params = {**self.default_params, **kwargs}
 
-        # Build llama.cpp command
-        cmd = [
-            str(self.llama_cli),
-            '-m', str(self.model_path),
-            '-p', prompt,
-            '-n', str(params['n_predict']),
-            '-c', str(params.get('n_ctx', 2048)),  # Context window
-            '--temp', str(params['temperature']),
-            '--top-p', str(params['top_p']),
-            '--top-k', str(params['top_k']),
-            '--repeat-penalty', str(params['repeat_penalty']),
-            '-t', str(params['threads']),
-            '--log-disable',  # Disable llama.cpp logging for cleaner output
-            '-st',  # Single-turn mode - exit after one response
-        ]
-
         try:
-            # Run llama.cpp with stdin closed to prevent interactive mode
-            result = subprocess.run(
-                cmd,
-                stdin=subprocess.DEVNULL,  # Close stdin - prevents waiting for input
-                capture_output=True,
-                text=True,
-                timeout=300  # 5 minute timeout (Raspberry Pi needs more time)
-            )
-
-            if result.returncode != 0:
+            # The resident model is loaded with the default context and threads
+            resident_ok = (params['n_ctx'] == self.default_params['n_ctx']
+                           and params['threads'] == self.default_params['threads'])
+            if resident_ok and self._load_bindings():
+                full_output, tokens_generated, error = self._complete_with_bindings(prompt, params)
+            elif resident_ok and self._start_server():
+                full_output, tokens_generated, error = self._complete_with_server(prompt, params)
+            else:
+                full_output, tokens_generated, error = self._complete_with_cli(prompt, params)
+
+            if error:
                 return {
                     'success': False,
-                    'error': f"LLM inference failed: {result.stderr}",
+                    'error': error,
                     'source': 'llm'
                 }
 
-            # Extract the response (llama.cpp outputs to both stdout and stderr)
-            full_output = result.stdout + "\n" + result.stderr
-
-            # Debug: Print raw output to help diagnose extraction issues
-            if os.environ.get('DEBUG_LLM'):
-                print(f"\n{'='*70}")
-                print("RAW LLM STDOUT:")
-                print(f"{'='*70}")
-                print(result.stdout)
-                print(f"\n{'='*70}")
-                print("RAW LLM STDERR:")
-                print(f"{'='*70}")
-                print(result.stderr[:2000])  # Limit stderr output
-                print(f"\n{'='*70}")
-                print("COMBINED OUTPUT:")
-                print(f"{'='*70}")
-                print(full_output[:2000])
-                print(f"{'='*70}\n")
-
             # Extract answer using multiple patterns
             answer = self._extract_answer(full_output)
 
@@ -240,7 +281,8 @@ Solution:"""
                 answer = full_output.strip()
 
             # Extract basic metadata (tokens generated)
-            tokens_generated = len(answer.split())  # Rough estimate
+            if tokens_generated is None:
+                tokens_generated = len(answer.split())  # Rough estimate
             self.stats['total_tokens_generated'] += tokens_generated
 
             return {
@@ -252,10 +294,10 @@ Solution:"""
                 'error': None
             }
 
-        except subprocess.TimeoutExpired:
+        except (subprocess.TimeoutExpired, requests.Timeout):
             return {
                 'success': False,
-                'error': 'LLM inference timed out (>300s)',
+                'error': f'LLM inference timed out (>{LLM_TIMEOUT}s)',
                 'source': 'llm'
             }
         except Exception as e:
@@ -265,6 +307,250 @@ Solution:"""
                 'source': 'llm'
             }
 
+    def _collect_until_boxed(self, pieces: Iterable[str]) -> Tuple[str, int]:
+        """
+        Join streamed output pieces, stopping at the first \\boxed{} answer.
+
+        Returns the joined text and the number of non-empty pieces, which
+        is the generated token count for token streams.
+
+        \\boxed{} is _extract_answer's highest-priority pattern and search
+        returns its first occurrence, so once it appears the rest of the
+        generation cannot change the extracted answer.
+        """
+        parts = []
+        for piece in pieces:
+            if not piece:
+                continue
+            parts.append(piece)
+            if '}' in piece and self._BOXED_RE.search(''.join(parts)):
+                break
+        return ''.join(parts), len(parts)
+
+    def _complete_with_cli(self, prompt: str, params: Dict[str, Any]) -> Tuple[Optional[str], Optional[int], Optional[str]]:
+        """Run one completion in a fresh llama-cli process; returns (output, tokens, error)."""
+        cmd = [
+            str(self.llama_cli),
+            '-m', str(self.model_path),
+            '-p', prompt,
+            '-n', str(params['n_predict']),
+            '-c', str(params.get('n_ctx', 2048)),  # Context window
+            '--temp', str(params['temperature']),
+            '--top-p', str(params['top_p']),
+            '--top-k', str(params['top_k']),
+            '--repeat-penalty', str(params['repeat_penalty']),
+            '-t', str(params['threads']),
+            '--log-disable',  # Disable llama.cpp logging for cleaner output
+            '-st',  # Single-turn mode - exit after one response
+        ]
+
+        # Run llama.cpp with stdin closed to prevent interactive mode and
+        # read its output line by line (llama.cpp writes to both stdout and
+        # stderr, so they are merged into one pipe)
+        with subprocess.Popen(
+            cmd,
+            stdin=subprocess.DEVNULL,  # Close stdin - prevents waiting for input
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True
+        ) as proc:
+            expired = threading.Event()
+
+            def kill_on_timeout():
+                expired.set()
+                proc.kill()
+
+            watchdog = threading.Timer(LLM_TIMEOUT, kill_on_timeout)
+            watchdog.start()
+            try:
+                full_output, _ = self._collect_until_boxed(proc.stdout)
+            finally:
+                watchdog.cancel()
+
+            answered = self._BOXED_RE.search(full_output) is not None
+            if answered:
+                proc.kill()  # Answer found - skip the remaining tokens
+            returncode = proc.wait()
+
+        if expired.is_set():
+            raise subprocess.TimeoutExpired(cmd, LLM_TIMEOUT)
+
+        if returncode != 0 and not answered:
+            return None, None, f"LLM inference failed: {full_output}"
+
+        # Debug: Print raw output to help diagnose extraction issues
+        if os.environ.get('DEBUG_LLM'):
+            print(f"\n{'='*70}")
+            print("RAW LLM OUTPUT (stdout + stderr):")
+            print(f"{'='*70}")
+            print(full_output[:4000])
+            print(f"{'='*70}\n")
+
+        # llama-cli does not report a token count
+        return full_output, None, None
+
+    def _complete_with_server(self, prompt: str, params: Dict[str, Any]) -> Tuple[Optional[str], Optional[int], Optional[str]]:
+        """Run one completion on the resident llama-server; returns (output, tokens, error)."""
+        # Leaving the with block closes the stream, which cancels generation
+        with self._session.post(
+            f"{self._server_url}/v1/chat/completions",
+            json={
+                # One user turn, so the model's chat template is applied as
+                # with llama-cli -st; the preamble stays the shared prefix
+                'messages': [{'role': 'user', 'content': prompt}],
+                'max_tokens': params['n_predict'],
+                'temperature': params['temperature'],
+                'top_p': params['top_p'],
+                'top_k': params['top_k'],
+                'repeat_penalty': params['repeat_penalty'],
+                'cache_prompt': True,  # Reuse the preamble's KV cache
+                'stream': True,
+            },
+            stream=True,
+            timeout=LLM_TIMEOUT
+        ) as response:
+            if response.status_code != 200:
+                return None, None, f"LLM inference failed: {response.text}"
+
+            # Server-sent events: one 'data: {json}' chunk per token, then 'data: [DONE]'
+            content, tokens = self._collect_until_boxed(
+                json.loads(line[6:])['choices'][0]['delta'].get('content')
+                for line in response.iter_lines()
+                if line.startswith(b'data: ') and line != b'data: [DONE]'
+            )
+
+        if os.environ.get('DEBUG_LLM'):
+            print(f"\n{'='*70}")
+            print("RAW LLM SERVER OUTPUT:")
+            print(f"{'='*70}")
+            print(content)
+            print(f"{'='*70}\n")
+
+        return content, tokens, None
+
+    def _complete_with_bindings(self, prompt: str, params: Dict[str, Any]) -> Tuple[Optional[str], Optional[int], Optional[str]]:
+        """Run one completion on the in-process llama-cpp-python model; returns (output, tokens, error)."""
+        # One user turn, so the model's chat template is applied as with llama-cli -st
+        stream = self._llama.create_chat_completion(
+            messages=[{'role': 'user', 'content': prompt}],
+            max_tokens=params['n_predict'],
+            temperature=params['temperature'],
+            top_p=params['top_p'],
+            top_k=params['top_k'],
+            repeat_penalty=params['repeat_penalty'],
+            stream=True,
+        )
+        try:
+            content, tokens = self._collect_until_boxed(
+                chunk['choices'][0]['delta'].get('content') for chunk in stream
+            )
+        finally:
+            stream.close()  # Stops generation if the answer came early
+
+        if os.environ.get('DEBUG_LLM'):
+            print(f"\n{'='*70}")
+            print("RAW LLM BINDINGS OUTPUT:")
+            print(f"{'='*70}")
+            print(content)
+            print(f"{'='*70}\n")
+
+        return content, tokens, None
+
+    def _load_bindings(self) -> bool:
+        """
+        Load the model in process with llama-cpp-python on first use.
+
+        Returns:
+            True if the model is loaded, False to fall back to llama-server/llama-cli
+        """
+        if self._llama is not None:
+            return True
+        if not self.use_bindings:
+            return False
+
+        try:
+            self._llama = Llama(
+                model_path=str(self.model_path),
+                n_ctx=self.default_params['n_ctx'],
+                n_threads=self.default_params['threads'],
+                verbose=False,
+            )
+            return True
+        except Exception as e:
+            print(f"⚠ WARNING: llama-cpp-python failed to load model ({e}), falling back to llama.cpp binaries")
+            self.use_bindings = False
+            return False
+
+    def _start_server(self) -> bool:
+        """
+        Start llama-server on first use and wait until the model is loaded.
+
+        Returns:
+            True if the server is ready, False to fall back to llama-cli
+        """
+        if self._server is not None and self._server.poll() is None:
+            return True
+        if self.llama_server is None:
+            return False
+
+        # Let the OS pick a free local port
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+
+        cmd = [
+            str(self.llama_server),
+            '-m', str(self.model_path),
+            '-c', str(self.default_params['n_ctx']),
+            '-t', str(self.default_params['threads']),
+            '--host', '127.0.0.1',
+            '--port', str(port),
+            '--log-disable',
+        ]
+        self._server = subprocess.Popen(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        # Stop the server at exit; close() unregisters so the handler can be freed
+        atexit.register(self.close)
+        self._server_url = f"http://127.0.0.1:{port}"
+        if self._session is None:
+            self._session = requests.Session()
+
+        # /health returns 503 while the model is loading
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while time.monotonic() < deadline and self._server.poll() is None:
+            try:
+                if self._session.get(f"{self._server_url}/health", timeout=5).status_code == 200:
+                    return True
+            except requests.RequestException:
+                pass
+            time.sleep(0.5)
+
+        print("⚠ WARNING: llama-server failed to start, falling back to llama-cli")
+        self.close()
+        self.llama_server = None
+        return False
+
+    def close(self):
+        """Release the resident model: unload the bindings and stop llama-server."""
+        self._llama = None
+        atexit.unregister(self.close)
+        if self._server is not None:
+            if self._server.poll() is None:
+                self._server.terminate()
+                try:
+                    self._server.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    self._server.kill()
+                    self._server.wait()
+            self._server = None
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
     def _extract_answer(self, text: str) -> Optional[str]:
         """
         Extract mathematical answer from LLM output using multiple patterns.
@@ -283,35 +569,8 @@ Solution:"""
         Returns:
             Extracted answer string, or None if no pattern matches
         """
-        # List of patterns to try, in order of preference
-        patterns = [
-            # LaTeX boxed format (highest priority for math LLMs)
-            r"\\boxed\{([^}]+)\}",
-
-            # GSM8K format
-            r"####\s*([^\n]+)",
-
-            # Explicit answer markers (multi-line aware)
-            r"(?:The answer is|Answer:|Final answer:)\s*[:]*\s*\$?\\?\[?\s*([^\\$\n]+)",
-
-            # Common conclusion phrases
-            r"Therefore,?\s+([^\n.]+)[.\n]",
-            r"Thus,?\s+([^\n.]+)[.\n]",
-            r"So,?\s+([^\n.]+)[.\n]",
-
-            # Solution markers
-            r"Solution:\s*([^\n]+)",
-            r"Result:\s*([^\n]+)",
-
-            # Equation format (equals sign)
-            r"=\s*([0-9.x\-+*/^()]+)\s*(?:\n|$)",
-
-            # Last resort: look for conclusion after steps
-            r"Step \d+.*?\n\s*([^\n]+)$",
-        ]
-
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE | re.MULTILINE)
+        for pattern in self._ANSWER_PATTERNS:
+            match = pattern.search(text)
             if match:
                 answer = match.group(1).strip()
                 # Remove asterisks (markdown bold)
@@ -320,7 +579,7 @@ Solution:"""
                 answer = answer.rstrip('.')
 
                 if os.environ.get('DEBUG_LLM'):
-                    print(f"✓ Extracted answer using pattern: {pattern[:50]}...")
+                    print(f"✓ Extracted answer using pattern: {pattern.pattern[:50]}...")
                     print(f"  Answer: {answer}")
 
                 return answer
@@ -383,6 +642,7 @@ def main():
 
     # Show statistics
     handler.print_stats()
+    handler.close()
 
 
 if __name__ == "__main__":
@@ -7,8 +7,12 @@ Main orchestrator for tutoring mode that wraps LLM responses in
 pedagogically-sound scaffolding.
 """
 
+import ast
 import logging
-from typing import Dict, Any, Optional
+import operator
+import re
+from fractions import Fraction
+from typing import Dict, Any, List, Optional
 from pathlib import Path
 import sys
 
@@ -19,6 +23,35 @@ from intent_classifier import IntentClassifier, UserIntent
 from tutoring_templates import TutoringTemplates, TutoringMode
 from response_validator import ResponseValidator
 
+# "what is 2+3?", "Calculate 123 * 456": an optional command word followed by
+# nothing but numbers, + - * /, parentheses and spaces
+_ARITHMETIC_RE = re.compile(
+    r'^\s*(?:what is|calculate|compute|evaluate)?:?\s*([\d\s.+\-*/()]*\d[\d\s.+\-*/()]*?)\s*\??\s*$',
+    re.IGNORECASE
+)
+
+# AST operators allowed when evaluating arithmetic (no powers, names or calls)
+_ARITHMETIC_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+
+def _eval_arithmetic_node(node: ast.AST) -> Fraction:
+    """Evaluate a whitelisted arithmetic AST exactly; ValueError otherwise."""
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        return Fraction(str(node.value))
+    if isinstance(node, ast.BinOp) and type(node.op) in _ARITHMETIC_OPS:
+        return _ARITHMETIC_OPS[type(node.op)](_eval_arithmetic_node(node.left),
+                                              _eval_arithmetic_node(node.right))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _ARITHMETIC_OPS:
+        return _ARITHMETIC_OPS[type(node.op)](_eval_arithmetic_node(node.operand))
+    raise ValueError(f"Unsupported expression: {ast.dump(node)}")
+
 
 class PedagogicalWrapper:
     """
@@ -47,6 +80,7 @@ class PedagogicalWrapper:
             'quick_answer_queries': 0,
             'validation_failures': 0,
             'regenerations': 0,
+            'direct_answers': 0,
         }
 
     def prepare_prompt(self, query: str, student_answer: Optional[str] = None,
@@ -68,8 +102,12 @@ class PedagogicalWrapper:
                 'mode': TutoringMode,       # Selected tutoring mode
                 'original_query': str,      # Original query
                 'student_answer': str or None,
+                'direct_answer': str or None,  # Computed answer for plain arithmetic
                 'metadata': dict           # Additional context
             }
+
+            When 'direct_answer' is set the query was a quick-answer
+            arithmetic expression; send it instead of calling the LLM.
         """
         self.stats['total_queries'] += 1
 
@@ -125,6 +163,13 @@ class PedagogicalWrapper:
             student_answer=intent_result.get('student_answer')
         )
 
+        # Plain arithmetic in quick answer mode needs no LLM
+        direct_answer = None
+        if intent_result['intent'] == UserIntent.QUICK_ANSWER:
+            direct_answer = self.evaluate_arithmetic(problem)
+            if direct_answer is not None:
+                self.stats['direct_answers'] += 1
+
         return {
             'prompt': prompt,
             'tutoring_mode': tutoring_enabled,
@@ -132,6 +177,7 @@ class PedagogicalWrapper:
             'mode': tutoring_mode,
             'original_query': query,
             'student_answer': intent_result.get('student_answer'),
+            'direct_answer': direct_answer,
             'metadata': {
                 'confidence': intent_result['confidence'],
                 'reasoning': intent_result['reasoning'],
@@ -139,6 +185,19 @@ class PedagogicalWrapper:
             }
         }
 
+    def prepare_prompts_batch(self, queries: List[str]) -> List[Dict[str, Any]]:
+        """
+        Prepare prompts for many queries at once (e.g. test bank runs).
+
+        Args:
+            queries: User queries, auto-classified like prepare_prompt()
+
+        Returns:
+            One prepare_prompt() result per query, in order
+        """
+        prepare = self.prepare_prompt
+        return [prepare(query) for query in queries]
+
     def validate_response(self, response: str, original_problem: str,
                          tutoring_mode: bool = True) -> Dict[str, Any]:
         """
@@ -201,6 +260,36 @@ class PedagogicalWrapper:
         ]
         return sum(indicators) >= 2
 
+    @staticmethod
+    def evaluate_arithmetic(problem: str) -> Optional[str]:
+        """
+        Compute a plain arithmetic query like "what is 2+3?" without the LLM.
+
+        Only numbers, + - * / and parentheses are evaluated, exactly (so
+        0.1 + 0.2 gives 0.3).
+
+        Args:
+            problem: The mathematical problem
+
+        Returns:
+            The result as a string, or None if the problem is not plain
+            arithmetic or the result cannot be shown (division by zero, too
+            many digits, beyond float range)
+        """
+        match = _ARITHMETIC_RE.match(problem)
+        if not match:
+            return None
+
+        try:
+            tree = ast.parse(match.group(1).strip(), mode='eval')
+            value = _eval_arithmetic_node(tree.body)
+            if value.denominator == 1:
+                return str(value.numerator)  # ValueError past int digit limit
+            return repr(float(value))        # OverflowError past float range
+        except (SyntaxError, ValueError, OverflowError, ZeroDivisionError,
+                RecursionError, MemoryError):
+            return None
+
     def extract_answer_from_response(self, response: str) -> Optional[str]:
         """
         Extract final answer from LLM response (if present).
@@ -269,6 +358,7 @@ class PedagogicalWrapper:
               f"({self.stats['quick_answer_queries']/max(self.stats['total_queries'], 1)*100:.1f}%)")
         print(f"   Validation failures: {self.stats['validation_failures']}")
         print(f"   Regenerations needed: {self.stats['regenerations']}")
+        print(f"   Direct arithmetic answers: {self.stats['direct_answers']}")
 
         print("\n" + "=" * 70)
 
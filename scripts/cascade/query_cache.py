@@ -9,7 +9,7 @@ import json
 import time
 import logging
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
 
 
@@ -71,8 +71,30 @@ class QueryCache:
         Returns:
             Cached result dict or None if not found/expired
         """
+        return self._get(self._hash_query(query), query)
+
+    def get_or_reserve(self, query: str) -> Tuple[bool, Optional[Dict[str, Any]], Tuple[str, str]]:
+        """
+        Look up a query, hashing it only once for a later commit().
+
+        Args:
+            query: Mathematical query string
+
+        Returns:
+            (hit, cached result or None, token to pass to commit() on a miss)
+        """
         cache_key = self._hash_query(query)
+        result = self._get(cache_key, query)
+        return result is not None, result, (cache_key, query)
+
+    def commit(self, token: Tuple[str, str], result: Dict[str, Any],
+               ttl_hours: Optional[int] = None):
+        """Cache the result for a query reserved with get_or_reserve()."""
+        cache_key, query = token
+        self._set(cache_key, query, result, ttl_hours)
 
+    def _get(self, cache_key: str, query: str) -> Optional[Dict[str, Any]]:
+        """Look up an already-hashed query."""
         # Check memory cache first
         if cache_key in self.memory_cache:
             entry = self.memory_cache[cache_key]
@@ -129,8 +151,11 @@ class QueryCache:
             result: Result dictionary from calculator engine
             ttl_hours: Time-to-live in hours (None = use default)
         """
-        cache_key = self._hash_query(query)
+        self._set(self._hash_query(query), query, result, ttl_hours)
 
+    def _set(self, cache_key: str, query: str, result: Dict[str, Any],
+             ttl_hours: Optional[int] = None):
+        """Store a result under an already-hashed query."""
         # Determine expiry time
         if ttl_hours == 0:
             expires_at = None  # Never expires
@@ -300,15 +325,15 @@ class SmartCache(QueryCache):
         # Track popular queries
         self.query_frequency: Dict[str, int] = {}
 
-    def get(self, query: str) -> Optional[Dict[str, Any]]:
+    def _get(self, cache_key: str, query: str) -> Optional[Dict[str, Any]]:
         """Get cached result with frequency tracking."""
         # Track frequency
-        cache_key = self._hash_query(query)
         self.query_frequency[cache_key] = self.query_frequency.get(cache_key, 0) + 1
 
-        return super().get(query)
+        return super()._get(cache_key, query)
 
-    def set(self, query: str, result: Dict[str, Any], ttl_hours: Optional[int] = None):
+    def _set(self, cache_key: str, query: str, result: Dict[str, Any],
+             ttl_hours: Optional[int] = None):
         """
         Cache with smart TTL based on query type.
 
@@ -332,7 +357,7 @@ class SmartCache(QueryCache):
             else:
                 ttl_hours = 24 * 3  # 3 days
 
-        super().set(query, result, ttl_hours)
+        super()._set(cache_key, query, result, ttl_hours)
 
     def get_popular_queries(self, top_n: int = 10) -> list:
         """Get most frequently accessed queries."""
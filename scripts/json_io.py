@@ -0,0 +1,30 @@
+"""
+JSON file helpers shared by the scrapers and the test runners.
+"""
+
+import json
+import os
+from pathlib import Path
+
+try:
+    import orjson
+except ImportError:  # Optional: fall back to the stdlib codec
+    orjson = None
+
+# stdlib json.dump issues many small writes; buffer them into large chunks
+JSON_WRITE_BUFFER = 1 << 20
+
+
+def write_json(path, data):
+    """Write indented UTF-8 JSON (orjson when available); int keys become strings."""
+    # Written to a sibling .tmp file and renamed, so a crash never leaves
+    # a truncated file behind
+    path = Path(path)
+    tmp_path = path.with_name(path.name + '.tmp')
+    if orjson is not None:
+        with open(tmp_path, 'wb', buffering=JSON_WRITE_BUFFER) as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+    else:
+        with open(tmp_path, 'w', encoding='utf-8', buffering=JSON_WRITE_BUFFER) as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
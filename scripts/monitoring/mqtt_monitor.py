@@ -21,6 +21,7 @@ import logging
 import time
 from datetime import datetime
 from collections import deque
+import itertools
 from typing import Dict, Any, Optional
 import threading
 
@@ -40,6 +41,7 @@ MQTT_BROKER = "localhost"  # Mosquitto on same Pi
 MQTT_PORT = 1883
 MQTT_KEEPALIVE = 60
 MQTT_CLIENT_ID = "holy-calc-monitor"
+MQTT_PUB_CLIENT_ID = "holy-calc-pub"
 
 # MQTT Topics
 MQTT_TOPIC_BASE = "holy-calc"
@@ -48,6 +50,8 @@ MQTT_TOPIC_SUBSCRIBE = f"{MQTT_TOPIC_BASE}/#"  # Subscribe to all
 # Data storage
 MAX_HISTORY_SIZE = 500  # ~15 minutes at 2s interval
 DATA_TIMEOUT_SECONDS = 10  # Consider ESP32 disconnected if no data
+HISTORY_MIN_INTERVAL_SECONDS = 10  # At most one history snapshot per interval
+HISTORY_FIELDS = ('timestamp', 'voltage', 'current', 'temperature', 'cpu_usage')
 
 # ============================================================================
 # GLOBAL DATA STORAGE
@@ -59,6 +63,10 @@ class ESP32Data:
     def __init__(self):
         self.lock = threading.Lock()
 
+        # Notified on every update so consumers can block instead of polling
+        self.updated = threading.Condition(self.lock)
+        self.version = 0
+
         # Current readings
         self.battery = {
             'voltage': None,
@@ -93,6 +101,7 @@ class ESP32Data:
 
         # Historical data
         self.history = deque(maxlen=MAX_HISTORY_SIZE)
+        self._next_history = 0.0  # time.monotonic() of the next allowed snapshot
 
         # Statistics
         self.stats = {
@@ -102,19 +111,33 @@ class ESP32Data:
             'first_message': None
         }
 
+    def _set_field(self, category: str, field: str, value: Any):
+        """Store one reading (caller holds the lock)"""
+        if category == 'battery':
+            self.battery[field] = value
+        elif category == 'environment':
+            self.environment[field] = value
+        elif category == 'esp32':
+            self.esp32[field] = value
+        elif category == 'alerts':
+            self.alerts[field] = value
+        elif category == 'status':
+            self.status = value
+
     def update_field(self, category: str, field: str, value: Any):
         """Update a single field (thread-safe)"""
+        self.update_fields([(category, field, value)])
+
+    def update_fields(self, updates):
+        """
+        Apply one MQTT message's (category, field, value) updates (thread-safe).
+
+        All fields land under one lock hold and waiters are notified once, so
+        readers never see a partly applied message.
+        """
         with self.lock:
-            if category == 'battery':
-                self.battery[field] = value
-            elif category == 'environment':
-                self.environment[field] = value
-            elif category == 'esp32':
-                self.esp32[field] = value
-            elif category == 'alerts':
-                self.alerts[field] = value
-            elif category == 'status':
-                self.status = value
+            for category, field, value in updates:
+                self._set_field(category, field, value)
 
             # Update metadata
             self.last_update = datetime.now()
@@ -125,17 +148,36 @@ class ESP32Data:
             if self.stats['first_message'] is None:
                 self.stats['first_message'] = datetime.now()
 
+            # Snapshot in the same lock hold as the message so a history row
+            # never mixes readings from two messages (throttled)
+            now = time.monotonic()
+            if now >= self._next_history:
+                self._next_history = now + HISTORY_MIN_INTERVAL_SECONDS
+                self._append_history()
+
+            self.version += 1
+            self.updated.notify_all()
+
+    def wait_for_update(self, version: Optional[int], timeout: Optional[float] = None) -> int:
+        """Block until data is newer than `version` (or timeout); return current version"""
+        with self.updated:
+            self.updated.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
     def add_to_history(self):
         """Snapshot current data to history"""
         with self.lock:
-            snapshot = {
-                'timestamp': datetime.now().isoformat(),
-                'voltage': self.battery.get('voltage'),
-                'current': self.battery.get('current'),
-                'temperature': self.environment.get('temperature'),
-                'cpu_usage': None  # Will be filled by pi-stats integration
-            }
-            self.history.append(snapshot)
+            self._append_history()
+
+    def _append_history(self):
+        """Append a snapshot of the current readings (caller holds the lock)"""
+        self.history.append({
+            'timestamp': datetime.now().isoformat(),
+            'voltage': self.battery.get('voltage'),
+            'current': self.battery.get('current'),
+            'temperature': self.environment.get('temperature'),
+            'cpu_usage': None  # Will be filled by pi-stats integration
+        })
 
     def get_snapshot(self) -> Dict[str, Any]:
         """Get current data snapshot (thread-safe)"""
@@ -151,12 +193,20 @@ class ESP32Data:
             }
 
     def get_history(self, count: Optional[int] = None) -> list:
-        """Get historical data"""
+        """Get historical data (the newest `count` snapshots, oldest first)"""
         with self.lock:
-            if count:
-                return list(self.history)[-count:]
+            if count and count > 0:
+                # Walk back from the tail so only `count` entries are touched
+                tail = list(itertools.islice(reversed(self.history), count))
+                tail.reverse()
+                return tail
             return list(self.history)
 
+    def get_history_columns(self, count: Optional[int] = None) -> Dict[str, list]:
+        """Get historical data as one list per field (no repeated keys in JSON)"""
+        history = self.get_history(count)
+        return {field: [entry[field] for entry in history] for field in HISTORY_FIELDS}
+
     def get_stats(self) -> Dict[str, Any]:
         """Get statistics"""
         with self.lock:
@@ -280,11 +330,12 @@ def on_message(client, userdata, msg):
 
 def handle_json_data(data: dict):
     """Handle JSON data message (all fields at once)"""
-    # Update all fields from JSON
-    for category in ['battery', 'environment', 'esp32']:
-        if category in data:
-            for field, value in data[category].items():
-                esp32_data.update_field(category, field, value)
+    # Update all fields from JSON as one update
+    esp32_data.update_fields([
+        (category, field, value)
+        for category in ['battery', 'environment', 'esp32'] if category in data
+        for field, value in data[category].items()
+    ])
 
     logger.debug(f"JSON update: {data.get('battery', {}).get('voltage')}V")
 
@@ -318,15 +369,21 @@ def create_mqtt_client():
 
     return client
 
-# ============================================================================
-# BACKGROUND TASKS
-# ============================================================================
+def create_publish_client():
+    """
+    Create a publish-only MQTT client.
 
-def history_snapshot_task():
-    """Periodically save snapshots to history"""
-    while True:
-        time.sleep(10)  # Every 10 seconds
-        esp32_data.add_to_history()
+    Commands go out on their own connection so HTTP handlers don't contend
+    with the subscriber's network loop for the same client lock.
+    """
+    client = mqtt.Client(client_id=MQTT_PUB_CLIENT_ID)
+
+    # Raise paho's default 20-message inflight cap so bursty publishers don't stall
+    client.max_inflight_messages_set(500)
+    client.max_queued_messages_set(0)  # 0 = unbounded outgoing queue
+    client.reconnect_delay_set(min_delay=1, max_delay=120)
+
+    return client
 
 # ============================================================================
 # API INTERFACE (for Flask integration)
@@ -342,6 +399,10 @@ def get_history_data(count: Optional[int] = None) -> list:
     """Get historical data (for Flask API)"""
     return esp32_data.get_history(count)
 
+def get_history_columns(count: Optional[int] = None) -> Dict[str, list]:
+    """Get historical data in columnar form (for Flask API)"""
+    return esp32_data.get_history_columns(count)
+
 def get_statistics() -> Dict[str, Any]:
     """Get statistics (for Flask API)"""
     return esp32_data.get_stats()
@@ -350,6 +411,10 @@ def is_esp32_connected() -> bool:
     """Check if ESP32 is currently connected"""
     return esp32_data.is_connected()
 
+def wait_for_update(version: Optional[int], timeout: Optional[float] = None) -> int:
+    """Block until newer ESP32 data arrives (for Flask push endpoints)"""
+    return esp32_data.wait_for_update(version, timeout)
+
 # ============================================================================
 # STANDALONE MODE
 # ============================================================================
@@ -366,10 +431,6 @@ def main():
     # Create MQTT client
     client = create_mqtt_client()
 
-    # Start background history task
-    history_thread = threading.Thread(target=history_snapshot_task, daemon=True)
-    history_thread.start()
-
     # Connect to broker
     try:
         logger.info("Connecting to MQTT broker...")
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Tests for the pedagogical wrapper's direct arithmetic answers.
+
+Run with: python3 -m pytest scripts/testing/test_pedagogical_wrapper.py
+"""
+
+import sys
+from pathlib import Path
+
+# Add scripts to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from cascade.pedagogical_wrapper import PedagogicalWrapper
+
+
+def test_evaluate_arithmetic():
+    """Plain arithmetic is computed exactly; anything else is left to the LLM."""
+    cases = [
+        ("Calculate 123 * 456", "56088"),
+        ("what is 0.1+0.2", "0.3"),
+        ("compute: (1+2)*3", "9"),
+        ("calculate 6/3", "2"),
+        ("what is 5/0", None),
+        ("calculate 2**10", None),
+        ("Solve: 2x + 5 = 13", None),
+    ]
+    for query, expected in cases:
+        assert PedagogicalWrapper.evaluate_arithmetic(query) == expected, query
+
+
+def test_evaluate_arithmetic_unprintable_results():
+    """Results too large to format fall back to the LLM instead of raising."""
+    # int -> str beyond sys.get_int_max_str_digits()
+    assert PedagogicalWrapper.evaluate_arithmetic('what is ' + '9' * 4000 + '*' + '9' * 4000) is None
+    # Fraction -> float beyond float range
+    assert PedagogicalWrapper.evaluate_arithmetic('what is 1' + '0' * 400 + '/3') is None
+
+
+def test_prepare_prompt_large_arithmetic():
+    """prepare_prompt still returns a prompt for oversized arithmetic."""
+    wrapper = PedagogicalWrapper()
+    result = wrapper.prepare_prompt('calculate 1' + '0' * 400 + '/3')
+    assert result['direct_answer'] is None
+    assert result['prompt']
+
+
+if __name__ == "__main__":
+    test_evaluate_arithmetic()
+    test_evaluate_arithmetic_unprintable_results()
+    test_prepare_prompt_large_arithmetic()
+    print("✓ All pedagogical wrapper tests passed")
@@ -100,8 +100,12 @@ class TeachingInterface(TI84Interface):
                     self.teaching_stats[key] += 1
 
             # Step 2: Send prompt to LLM (force LLM layer for pedagogical responses)
-            # The pedagogical wrapper has already formatted the prompt appropriately
-            result = self.engine.solve(prompt_result['prompt'], force_layer='llm')
+            # The pedagogical wrapper has already formatted the prompt appropriately,
+            # and already computed plain quick-answer arithmetic
+            if prompt_result['direct_answer'] is not None:
+                result = {'success': True, 'result': prompt_result['direct_answer'], 'source': 'arithmetic'}
+            else:
+                result = self.engine.solve(prompt_result['prompt'], force_layer='llm')
 
             elapsed = time.time() - start_time
 